@@ -1,39 +1,76 @@
-import copy
-import docker
-import kazoo.client
-import kazoo.exceptions
+import calendar
+import collections
+import concurrent.futures
+import functools
+import gzip
+import importlib
+import json
 import logging
-import logging.config
 import os
-import ramcloud
-
-import CoordinatorClusterClock_pb2
-import CoordinatorUpdateInfo_pb2
-import EnumerationIterator_pb2
-import Histogram_pb2
-import Indexlet_pb2
-import LogMetrics_pb2
-import MasterRecoveryInfo_pb2
-import MetricList_pb2
-import ProtoBufTest_pb2
-import RecoveryPartition_pb2
-import ServerConfig_pb2
-import ServerListEntry_pb2
-import ServerList_pb2
-import ServerStatistics_pb2
-import SpinLockStatistics_pb2
-import TableConfig_pb2
-import Tablets_pb2
-import TableManager_pb2
-import Table_pb2
-
-from google.protobuf import text_format
-
-logging.config.fileConfig('/src/testing/log.ini')
-logger = logging.getLogger('cluster')
-
-docker_client = docker.from_env()
-docker_api = docker.APIClient(base_url='unix://var/run/docker.sock')
+import threading
+import time
+
+# Importing this module is kept cheap, since ramcloud_test_cluster.py runs it for every command: docker,
+# kazoo, ramcloud and the protobuf modules are imported, and log.ini is read, only once something here
+# first needs them. The *_pb2 modules and docker_client/docker_api are still there as attributes of this
+# module, e.g. ctu.Tablets_pb2, through __getattr__ below.
+proto_modules = [
+    'CoordinatorClusterClock_pb2',
+    'CoordinatorUpdateInfo_pb2',
+    'EnumerationIterator_pb2',
+    'Histogram_pb2',
+    'Indexlet_pb2',
+    'LogMetrics_pb2',
+    'MasterRecoveryInfo_pb2',
+    'MetricList_pb2',
+    'ProtoBufTest_pb2',
+    'RecoveryPartition_pb2',
+    'ServerConfig_pb2',
+    'ServerListEntry_pb2',
+    'ServerList_pb2',
+    'ServerStatistics_pb2',
+    'SpinLockStatistics_pb2',
+    'TableConfig_pb2',
+    'Tablets_pb2',
+    'TableManager_pb2',
+    'Table_pb2',
+]
+
+def __getattr__(name):
+    if name in proto_modules:
+        return importlib.import_module(name)
+    if name == 'docker_client':
+        return get_docker_client()
+    if name == 'docker_api':
+        return get_docker_api()
+    raise AttributeError('module {!r} has no attribute {!r}'.format(__name__, name))
+
+@functools.lru_cache(maxsize=None)
+def configure_logging():
+    import logging.config
+    logging.config.fileConfig('/src/testing/log.ini')
+    # Reading log.ini used to happen before docker and kazoo were imported, and so disabled their loggers;
+    # now that they may be imported first, keep their debug chatter out of the console explicitly.
+    for name in ['docker', 'kazoo', 'urllib3']:
+        logging.getLogger(name).setLevel(logging.WARNING)
+
+class ClusterLogger:
+    # Stands in for the 'cluster' logger, setting up logging from log.ini the first time it's used
+    def __getattr__(self, name):
+        configure_logging()
+        return getattr(logging.getLogger('cluster'), name)
+
+logger = ClusterLogger()
+
+@functools.lru_cache(maxsize=None)
+def get_docker_client():
+    import docker
+    return docker.from_env()
+
+@functools.lru_cache(maxsize=None)
+def get_docker_api():
+    import docker
+    return docker.APIClient(base_url='unix://var/run/docker.sock')
 
 ten_minutes = 600  # number of seconds in 10 minutes
 
@@ -73,6 +110,7 @@ def set_docker_names(val):
     (docker_image_name, docker_network_name, docker_node_prefix) = names[0:3]
 
 def get_zookeeper_client(ensemble, read_only=True):
+    import kazoo.client
     client = kazoo.client.KazooClient(hosts=external_storage_string(ensemble), read_only=read_only)
     client.start()
     return client
@@ -90,12 +128,12 @@ def ensemble_servers_string(ensemble):
     return ' '.join(['server.{}={}:2888:3888;2181'.format(zkid, ip) for (zkid, ip) in list(ensemble.items())])
 
 def get_node_image():
-    existing_images = docker_client.images.list(name=docker_image_name)
+    existing_images = get_docker_client().images.list(name=docker_image_name)
     if (len(existing_images) > 0):
         logger.info('Found existing {} image, using that...'.format(docker_image_name))
         return existing_images[0]
     logger.info('Building {} image...'.format(docker_image_name))
-    node_image = docker_client.images.build(path='/src',
+    node_image = get_docker_client().images.build(path='/src',
                                             dockerfile='/src/config/Dockerfile.node',
                                             tag=docker_image_name)[0]
     logger.info('Building {} image...succeeded'.format(docker_image_name))
@@ -107,16 +145,37 @@ def make_docker_network(name, subnet):
     # then the gateway should be a.b.c.254, with a.b.c dictated by cluster_ip_prefix
     # NOTE: There are probably other valid cluster_notation values that work with docker.types.IPAMPool,
     # but this requires a bit of careful time and experimentation to find out.
+    import docker
     gateway=None
     if (cluster_notation == 24):
         gateway="{}.254".format(cluster_ip_prefix)
     ramcloud_net_pool = docker.types.IPAMPool(subnet=subnet, gateway=gateway)
     ramcloud_net_config = docker.types.IPAMConfig(pool_configs=[ramcloud_net_pool])
-    network = docker_client.networks.create(name, ipam=ramcloud_net_config, check_duplicate=True)
+    network = get_docker_client().networks.create(name, ipam=ramcloud_net_config, check_duplicate=True)
     logger.info('Creating docker network %s on subnet %s...succeeded', name, subnet)
     return network
 
-def launch_node(cluster_name, hostname, zk_servers, external_storage, zkid, ip, image, network):
+# The rc-server settings a node is launched with (see config/supervisord.conf): the number of backup
+# replicas of each segment, whether backups are chosen with the plus-one scheme, over how many servers after
+# the master plus-one backups rotate (1 puts them all on the next server), and any extra rc-server
+# arguments, e.g. '--totalMasterMemory 4000' for clusters holding more data.
+class ServerOptions(collections.namedtuple('ServerOptions', ['replicas', 'use_plus_one_backup',
+                                                             'plus_one_backup_window', 'args'])):
+    __slots__ = ()
+
+    def environment(self):
+        return {
+            'RC_REPLICAS': str(self.replicas),
+            'RC_USE_PLUS_ONE_BACKUP': 'true' if self.use_plus_one_backup else 'false',
+            'RC_PLUS_ONE_BACKUP_WINDOW': str(self.plus_one_backup_window),
+            'RC_SERVER_ARGS': self.args
+        }
+
+default_server_options = ServerOptions(replicas = 1, use_plus_one_backup = True, plus_one_backup_window = 1,
+                                       args = '')
+
+def launch_node(cluster_name, hostname, zk_servers, external_storage, zkid, ip, image, network,
+                server_options = default_server_options):
     environment = {
         'ZOO_MY_ID': zkid,
         'ZOO_SERVERS': zk_servers,
@@ -124,13 +183,14 @@ def launch_node(cluster_name, hostname, zk_servers, external_storage, zkid, ip,
         'RC_CLUSTER_NAME': cluster_name,
         'RC_IP': ip
     }
+    environment.update(server_options.environment())
 
-    networking_config = docker_api.create_networking_config({
-        network.name: docker_api.create_endpoint_config(ipv4_address=ip)
+    networking_config = get_docker_api().create_networking_config({
+        network.name: get_docker_api().create_endpoint_config(ipv4_address=ip)
     })
 
     logger.info('Launching node container %s with IP address %s...', hostname, ip)
-    container_dictionary = docker_api.create_container(image.id,
+    container_dictionary = get_docker_api().create_container(image.id,
                                                        environment=environment,
                                                        hostname=hostname,
                                                        name=hostname,
@@ -140,20 +200,90 @@ def launch_node(cluster_name, hostname, zk_servers, external_storage, zkid, ip,
     # It's possible to create the container but be unable to start it. If that happens, we need to clean up after
     # ourselves before returning to the caller.
     try:
-        docker_api.start(container_id)
+        get_docker_api().start(container_id)
     except Exception as exc:
         logger.exception('Error starting container %s. Will attempt to delete...', ip)
-        docker_client.remove(docker_client.containers.get(container_id))
+        get_docker_client().remove(get_docker_client().containers.get(container_id))
         raise
 
     logger.info('Launching node container %s with IP address %s...successful', hostname, ip)
-    return docker_client.containers.get(container_id)
+    return get_docker_client().containers.get(container_id)
+
+def remove_containers(docker_containers):
+    def remove(dc):
+        print("removing container:", dc.name)
+        dc.remove(force=True)
+    with concurrent.futures.ThreadPoolExecutor(max_workers=max(len(docker_containers), 1)) as executor:
+        list(executor.map(remove, docker_containers))
+
+# Polls predicate until it returns something true, ignoring any exceptions it raises while the cluster comes up.
+def wait_until(what, predicate, timeout = 120, interval = 0.5):
+    logger.info('Waiting for %s...', what)
+    deadline = time.time() + timeout
+    while True:
+        try:
+            if predicate():
+                logger.info('Waiting for %s...done', what)
+                return
+        except Exception as exc:
+            logger.debug('Waiting for %s: %s', what, exc)
+        if time.time() > deadline:
+            raise TimeoutError('Timed out after {}s waiting for {}'.format(timeout, what))
+        time.sleep(interval)
+
+def zookeeper_quorum_up(ensemble):
+    # A client that isn't read-only only connects to a zk server that's part of a quorum
+    import kazoo.client
+    client = kazoo.client.KazooClient(hosts=external_storage_string(ensemble), read_only=False)
+    try:
+        client.start(timeout=2)
+        return True
+    finally:
+        client.stop()
+        client.close()
+
+def coordinator_up(zk_client):
+    return zk_client.exists('/ramcloud/main/coordinator') and zk_client.get('/ramcloud/main/coordinator')[0]
+
+# The supervisord program (see config/supervisord.conf) that runs each process killProcess() may kill
+supervisor_programs = {'rc-server': 'ramcloud-server', 'rc-coordinator': 'ramcloud-coordinator'}
+
+server_status_up = 0  # ServerStatus::UP
+server_status_crashed = 1  # ServerStatus::CRASHED
+master_service = 0  # WireFormat::MASTER_SERVICE, a bit number in ServerListEntry.services
+backup_service = 1  # WireFormat::BACKUP_SERVICE
+
+def servers_enlisted(zk_client, num_servers):
+    servers = ZkSnapshot(zk_client, [servers_config]).servers()
+    return len([s for s in servers if s.status == server_status_up]) >= num_servers
+
+def cluster_ready(ensemble, num_servers):
+    if not zookeeper_quorum_up(ensemble):
+        return False
+    zk_client = get_zookeeper_client(ensemble)
+    try:
+        return coordinator_up(zk_client) and servers_enlisted(zk_client, num_servers)
+    finally:
+        zk_client.stop()
+
+# Waits for a freshly launched cluster to be usable: zk has a quorum, a coordinator has been elected, and
+# num_servers servers have enlisted with it.
+def wait_for_cluster(ensemble, num_servers, timeout = 120):
+    wait_until('zookeeper quorum', lambda: zookeeper_quorum_up(ensemble), timeout)
+    zk_client = get_zookeeper_client(ensemble)
+    try:
+        wait_until('coordinator', lambda: coordinator_up(zk_client), timeout)
+        wait_until('{} servers to enlist'.format(num_servers),
+                   lambda: servers_enlisted(zk_client, num_servers), timeout)
+    finally:
+        zk_client.stop()
 
 def get_status():
-    docker_containers = docker_client.containers.list(all=True, filters={"name":"{}-*".format(docker_node_prefix)})
+    import docker
+    docker_containers = get_docker_client().containers.list(all=True, filters={"name":"{}-*".format(docker_node_prefix)})
     docker_network = False
     try:
-        docker_network = docker_client.networks.get(docker_network_name)
+        docker_network = get_docker_client().networks.get(docker_network_name)
     except docker.errors.NotFound as nf:
         pass
     if not docker_containers:
@@ -167,6 +297,7 @@ def get_status():
     return (docker_network, docker_containers)
 
 def destroy_network_and_containers(docker_network, docker_containers):
+    import docker
     try:
         for dc in docker_containers:
             print("removing container:", dc.name)
@@ -183,88 +314,164 @@ def get_ensemble(num_nodes = 3):
     return {i: '{}.{}'.format(cluster_ip_prefix, i) for i in range(1, num_nodes + 1)}
 
 def get_table_names(ensemble):
+    zkc = get_zookeeper_client(ensemble)
     try:
-        zkc = get_zookeeper_client(ensemble)
-        return zkc.get_children('/ramcloud/main/tables')
-    except kazoo.exceptions.NoNodeError as nne:
-        # If tables in zk exists but wasn't initialized, then this is thrown, so return an empty list
-        return []
+        # If tables in zk doesn't exist or wasn't initialized, the snapshot is empty
+        return [table.name for table in ZkSnapshot(zkc, [tables_config]).items(tables_config)]
+    finally:
+        zkc.stop()
 
 def drop_tables(ensemble, table_names):
+    import ramcloud
     r = ramcloud.RAMCloud()
     external_storage = 'zk:' + external_storage_string(ensemble)
     r.connect(external_storage, 'main')
     for table_name in table_names:
         r.drop_table(table_name)
 
-def output_logs_detached(docker_containers, path="/src/tmp"):
-    if not os.path.exists(path):
-        os.makedirs(path)
-    for container in docker_containers:
-        outfile = '%s/%s.out' % (path, container.name)
-        f = open(outfile, 'wb')
-        # make a stream of output logs to iterate and write to file
-        # (uses less memory than storing the container log as a string),
-        # and don't keep the stream open for new logs, since we want
-        # to get thru outputting whatever we got for this container
-        # before doing same for next container.
-        for line in container.logs(stream=True, follow=False):
-            f.write(line)
-        f.close()
+# Parses the timestamp docker puts at the front of each log line when asked for timestamps, e.g.
+# b'2020-06-01T12:34:56.123456789Z message', into ((seconds, nanoseconds), b'message').
+def split_log_timestamp(line):
+    stamp, _, rest = line.partition(b' ')
+    date, _, fraction = stamp.rstrip(b'Z').partition(b'.')
+    seconds = calendar.timegm(time.strptime(date.decode(), '%Y-%m-%dT%H:%M:%S'))
+    nanoseconds = int((fraction + b'000000000')[:9])
+    return (seconds, nanoseconds), rest
+
+# Collects container logs into path, one file per container named after it. A cursor per container,
+# kept in path/.log_cursors.json, records the timestamp of the last line written, so each collection
+# only fetches and appends what was logged since the previous one, even across processes. Containers
+# are read concurrently.
+#
+# With compress, logs go to .out.gz files instead (appending gzip members as they're collected). With
+# max_bytes, a file that grows past that size is rotated to .1, .2, ... keeping at most backups of them.
+class LogCollector:
+    cursor_file = '.log_cursors.json'
+    # While following, how often (in seconds) the cursors are saved, so a killed follower loses little
+    cursor_save_interval = 1.0
+
+    def __init__(self, path="/src/tmp", compress=False, max_bytes=0, backups=3):
+        self.path = path
+        self.compress = compress
+        self.max_bytes = max_bytes
+        self.backups = backups
+        self._lock = threading.Lock()
+        self._following = []
+        self._threads = []
+        if not os.path.exists(path):
+            os.makedirs(path)
+        try:
+            with open(os.path.join(path, self.cursor_file)) as f:
+                self.cursors = json.load(f)
+        except (IOError, ValueError):
+            self.cursors = {}
+
+    def outfile(self, container):
+        return '%s/%s.out%s' % (self.path, container.name, '.gz' if self.compress else '')
+
+    def _save_cursors(self):
+        # called with _lock held
+        tmp = os.path.join(self.path, self.cursor_file + '.tmp')
+        with open(tmp, 'w') as f:
+            json.dump(self.cursors, f)
+        os.replace(tmp, os.path.join(self.path, self.cursor_file))
+
+    def _open(self, container, fresh):
+        outfile = self.outfile(container)
+        if (self.max_bytes and os.path.exists(outfile) and os.path.getsize(outfile) >= self.max_bytes):
+            for n in range(self.backups - 1, 0, -1):
+                if os.path.exists('%s.%d' % (outfile, n)):
+                    os.replace('%s.%d' % (outfile, n), '%s.%d' % (outfile, n + 1))
+            if self.backups:
+                os.replace(outfile, outfile + '.1')
+            else:
+                os.remove(outfile)
+        mode = 'wb' if fresh else 'ab'
+        return gzip.open(outfile, mode) if self.compress else open(outfile, mode)
+
+    def _copy(self, container, follow):
+        # A cursor from another container of the same name (an earlier cluster) doesn't count, and its
+        # file is started over.
+        with self._lock:
+            cursor = self.cursors.get(container.name)
+        if cursor and cursor[0] != container.id:
+            cursor = None
+        since = tuple(cursor[1:]) if cursor else None
+        last = since
+        stream = container.logs(stream=True, follow=follow, timestamps=True,
+                                since=since[0] if since else None)
+        if follow:
+            with self._lock:
+                self._following.append(stream)
+        f = self._open(container, fresh=cursor is None)
+        written = 0
+        saved_at = time.time()
+        try:
+            for line in stream:
+                try:
+                    stamp, rest = split_log_timestamp(line)
+                    if since and stamp <= since:
+                        continue  # written by an earlier collection; since only has a resolution of seconds
+                    last = stamp
+                except ValueError:
+                    # not a line docker stamped; keep it as is
+                    rest = line
+                f.write(rest)
+                written += len(rest)
+                if follow:
+                    if self.max_bytes and written >= self.max_bytes:
+                        f.close()
+                        f = self._open(container, fresh=False)
+                        written = 0
+                    if last and time.time() - saved_at >= self.cursor_save_interval:
+                        # the lines must be on disk before a cursor that says they are
+                        f.flush()
+                        with self._lock:
+                            self.cursors[container.name] = [container.id, last[0], last[1]]
+                            self._save_cursors()
+                        saved_at = time.time()
+        finally:
+            f.close()
+            with self._lock:
+                if last:
+                    self.cursors[container.name] = [container.id, last[0], last[1]]
+                self._save_cursors()
+
+    # Appends whatever each container logged since the last collection, and returns once all are done.
+    def collect(self, docker_containers):
+        with concurrent.futures.ThreadPoolExecutor(max_workers=max(len(docker_containers), 1)) as executor:
+            for result in [executor.submit(self._copy, c, False) for c in docker_containers]:
+                result.result()
+
+    # Keeps appending each container's logs as they're written, from background threads, until stop().
+    def follow(self, docker_containers):
+        for container in docker_containers:
+            t = threading.Thread(target=self._copy, args=(container, True), name='logs-' + container.name)
+            t.daemon = True
+            t.start()
+            self._threads.append(t)
+
+    def stop(self):
+        with self._lock:
+            following, self._following = self._following, []
+        for stream in following:
+            stream.close()
+        for t in self._threads:
+            t.join(10)
+        self._threads = []
+
+def output_logs_detached(docker_containers, path="/src/tmp", compress=False):
+    LogCollector(path, compress).collect(docker_containers)
 
 def output_zk_detached(ensemble, path="/src/tmp"):
     if not os.path.exists(path):
         os.makedirs(path)
     zk_client = get_zookeeper_client(ensemble)
-    zk_table_configs = [
-        ZkTableConfiguration(
-            outfile = "config.out", 
-            zk_path = "/zookeeper/config", 
-            proto = "string", 
-            is_leaf = True),
-        ZkTableConfiguration(
-            outfile = "quota.out", 
-            zk_path = "/zookeeper/quota", 
-            proto = "string", 
-            is_leaf = True),
-        ZkTableConfiguration(
-            outfile = "coordinatorClusterClock.out", 
-            zk_path = "/ramcloud/main/coordinatorClusterClock", 
-            proto = CoordinatorClusterClock_pb2.CoordinatorClusterClock(), 
-            is_leaf = True),
-        ZkTableConfiguration(
-            outfile = "tables.out", 
-            zk_path = "/ramcloud/main/tables", 
-            proto = Table_pb2.Table(), 
-            is_leaf = False),
-        ZkTableConfiguration(
-            outfile = "tableManager.out", 
-            zk_path = "/ramcloud/main/tableManager", 
-            proto = TableManager_pb2.TableManager(), 
-            is_leaf = True),
-        ZkTableConfiguration(
-            outfile = "coordinator.out", 
-            zk_path = "/ramcloud/main/coordinator", 
-            proto = "string", 
-            is_leaf = True),
-        ZkTableConfiguration(
-            outfile = "servers.out", 
-            zk_path = "/ramcloud/main/servers", 
-            proto = ServerListEntry_pb2.ServerListEntry(), 
-            is_leaf = False),
-        ZkTableConfiguration(
-            outfile = "coordinatorUpdateManager.out", 
-            zk_path = "/ramcloud/main/coordinatorUpdateManager", 
-            proto = CoordinatorUpdateInfo_pb2.CoordinatorUpdateInfo(), 
-            is_leaf = True),
-        ZkTableConfiguration(
-            outfile = "clientLeaseAuthority.out", 
-            zk_path = "/ramcloud/main/clientLeaseAuthority", 
-            proto = "string", 
-            is_leaf = False),
-    ]
-    for zk_table_config in zk_table_configs:
-        zk_table_config.dump(path, zk_client)
+    try:
+        for zk_table_config in zk_table_configs:
+            zk_table_config.dump(path, zk_client)
+    finally:
+        zk_client.stop()
 
 # ClusterTest Usage in Python interpreter:
 # >>> import cluster_test_utils as ctu
@@ -277,192 +484,501 @@ def output_zk_detached(ensemble, path="/src/tmp"):
 # < Check output files in /src/tmp >
 # >>> x.tearDown()
 class ClusterTest:
-    def setUp(self, num_nodes = 4):
+    # Pass reuse = True to keep the cluster of the previous setUp() when it's still healthy and the same size,
+    # dropping its tables instead of rebuilding it; processes stopped with killProcess() are started again
+    # first. When it isn't, only the containers are replaced, on the same docker network. Pair it with
+    # tearDown(keep = True), and a plain tearDown() once the tests are done, e.g. in tearDownModule().
+    # server_options sets how the rc-servers replicate; see ServerOptions.
+    def setUp(self, num_nodes = 4, reuse = False, server_options = default_server_options):
         assert (num_nodes >= 3), ("num_nodes(%s) must be at least 3."%num_nodes)
 
-        # clean out any old docker fixtures
-        docker_containers = docker_client.containers.list(all=True, filters={"name":"{}-*".format(docker_node_prefix)})
-        try:
-            for dc in docker_containers:
-                print("removing container:", dc.name)
-                dc.remove(force=True)
-            docker_network = docker_client.networks.get(docker_network_name)
-            print("removing network:", docker_network);
-            docker_network.remove()
-        except docker.errors.NotFound as nf:
-            # NotFound is ignored because we're trying to remove the network whether it's there or not
-            pass
+        if reuse and getattr(self, 'killed', None) and not self.restartKilledProcesses():
+            self.dirty = True
+        if reuse and self.isReusable(num_nodes, server_options):
+            logger.info('Reusing the running %s-node cluster', num_nodes)
+            self.reset()
+            return
 
-        self.ramcloud_network = make_docker_network(docker_network_name, cluster_cidr)
+        network = getattr(self, 'ramcloud_network', None) if reuse else None
+        # the watches of a topology on the old cluster won't survive its zk servers being replaced
+        self.stopTopology()
+
+        # clean out any old docker fixtures
+        import docker
+        docker_containers = get_docker_client().containers.list(all=True, filters={"name":"{}-*".format(docker_node_prefix)})
+        remove_containers(docker_containers)
+        if network is None:
+            try:
+                docker_network = get_docker_client().networks.get(docker_network_name)
+                print("removing network:", docker_network);
+                docker_network.remove()
+            except docker.errors.NotFound as nf:
+                # NotFound is ignored because we're trying to remove the network whether it's there or not
+                pass
+            network = make_docker_network(docker_network_name, cluster_cidr)
+
+        self.ramcloud_network = network
         self.node_image = get_node_image()
+        import ramcloud
         self.rc_client = ramcloud.RAMCloud()
         self.node_containers = {}
+        self.dirty = False
+        self.killed = []
+        self.server_options = server_options
         self.ensemble = {i: '{}.{}'.format(cluster_ip_prefix, i) for i in range(1, num_nodes + 1)}
         zk_servers = ensemble_servers_string(self.ensemble)
         external_storage = 'zk:' + external_storage_string(self.ensemble)
-        for i in range(1, num_nodes + 1):
-            hostname = '{}-{}'.format(docker_node_prefix, i)
-            self.node_containers[self.ensemble[i]] = launch_node('main',
-                                                                 hostname,
-                                                                 zk_servers,
-                                                                 external_storage,
-                                                                 i,
-                                                                 self.ensemble[i],
-                                                                 self.node_image,
-                                                                 self.ramcloud_network)
+        # Bring all the nodes up at once; they find each other through zk
+        with concurrent.futures.ThreadPoolExecutor(max_workers=num_nodes) as executor:
+            launches = {self.ensemble[i]: executor.submit(launch_node,
+                                                          'main',
+                                                          '{}-{}'.format(docker_node_prefix, i),
+                                                          zk_servers,
+                                                          external_storage,
+                                                          i,
+                                                          self.ensemble[i],
+                                                          self.node_image,
+                                                          self.ramcloud_network,
+                                                          server_options)
+                        for i in range(1, num_nodes + 1)}
+        for (ip, launch) in launches.items():
+            if not launch.exception():
+                self.node_containers[ip] = launch.result()
+        for launch in launches.values():
+            # re-raises the first launch failure, once the nodes that did launch are recorded for tearDown
+            launch.result()
+        wait_for_cluster(self.ensemble, num_nodes)
         self.rc_client.connect(external_storage, 'main')
-
+        self.topology = ClusterTopology(self.ensemble)
+
+    # Whether setUp(num_nodes, reuse = True, server_options) can keep the current cluster.
+    def isReusable(self, num_nodes, server_options = default_server_options):
+        if getattr(self, 'dirty', True) or len(getattr(self, 'node_containers', {})) != num_nodes:
+            return False
+        if getattr(self, 'server_options', None) != server_options:
+            return False
+        try:
+            return cluster_ready(self.ensemble, num_nodes)
+        except Exception:
+            logger.exception('Cluster health check failed, rebuilding')
+            return False
+
+    # Clears out the data in a running cluster, like ramcloud_test_cluster.py --action reset.
+    def reset(self):
+        table_names = get_table_names(self.ensemble)
+        for table_name in table_names:
+            self.rc_client.drop_table(table_name)
+
+    # Runs killall in a node's container. The next setUp(reuse = True) starts the process again, so the
+    # cluster can be kept; a restarted rc-server enlists under a new server id.
+    def killProcess(self, host, process, signal = 'SIGKILL'):
+        self.killed.append((host, process))
+        return self.node_containers[host].exec_run('killall -{} {}'.format(signal, process))
+
+    # Has supervisord start each process killProcess() stopped (it doesn't restart them itself), then waits
+    # for the cluster to be ready again. Returns False if a process couldn't be restarted.
+    def restartKilledProcesses(self):
+        killed, self.killed = self.killed, []
+        for (host, process) in sorted(set(killed)):
+            program = supervisor_programs.get(process)
+            if program is None:
+                return False
+            result = self.node_containers[host].exec_run('supervisorctl start ' + program)
+            # a process that was only stopped with SIGSTOP, or SIGCONT'ed since, is still running
+            if result.exit_code != 0 and b'already started' not in result.output:
+                logger.error('Could not restart %s on %s: %s', process, host, result.output)
+                return False
+        try:
+            wait_for_cluster(self.ensemble, len(self.ensemble))
+        except TimeoutError:
+            logger.exception('Cluster did not come back after restarting killed processes')
+            return False
+        return True
+
+    # Copies the server list, as self.topology has it right now, into plain dicts. self.topology itself
+    # stays current, so prefer it when servers may crash or enlist in between.
     def buildServerIdMap(self):
-        zk_client = get_zookeeper_client(self.ensemble)
-        zk_config = ZkTableConfiguration(
-                outfile = "servers.out", 
-                zk_path = "/ramcloud/main/servers", 
-                proto = ServerListEntry_pb2.ServerListEntry(), 
-                is_leaf = False)
-        server_protos = zk_config.getTable(zk_client)
-        self.server_id_to_host = {s.server_id : get_host(s.service_locator) for s in server_protos}
-        self.host_to_server_id = {get_host(s.service_locator) : s.server_id for s in server_protos}
-        zk_client.stop()
+        servers = self.topology.servers()
+        self.server_id_to_host = {s.server_id : s.host for s in servers}
+        self.host_to_server_id = {s.host : s.server_id for s in servers}
 
-    # This method assumes we're running rc-server with the usePlusOneBackup flag set to true.
-    # We might modify this method in future to account for downed server instances.
+    # The backup the plus-one selector of master_server_id currently uses, from the live server list; see
+    # ClusterTopology.backup_candidates. Assumes rc-server runs with usePlusOneBackup set.
     def getPlusOneBackupId(self, master_server_id):
-        n = len(self.node_containers)
-        backup_server_id = master_server_id + 1
-        if (backup_server_id > n):
-            backup_server_id = 1
-        return backup_server_id
+        return self.topology.plus_one_backup_id(master_server_id)
+
+    def stopTopology(self):
+        if getattr(self, 'topology', None):
+            self.topology.stop()
+            self.topology = None
 
     def createTestValue(self):
         self.rc_client.create_table('test')
         self.table = self.rc_client.get_table_id('test')
-        self.rc_client.write(self.table, 'testKey', 'testValue')
+        # On a reused cluster, versions carry on from where the dropped tables left off
+        self.test_version = self.rc_client.write(self.table, 'testKey', 'testValue')
 
     # Definitely useful to invoke this method from the Python interpreter.
-    def outputLogs(self, path="/src/tmp"):
-        if not os.path.exists(path):
-            os.makedirs(path)
-        for (_, container) in list(self.node_containers.items()):
-            outfile = '%s/%s.out' % (path, container.name)
-            f = open(outfile, 'wb')
-            # make a stream of output logs to iterate and write to file
-            # (uses less memory than storing the container log as a string),
-            # and don't keep the stream open for new logs, since we want
-            # to get thru outputting whatever we got for this container
-            # before doing same for next container.
-            for line in container.logs(stream=True, follow=False):
-                f.write(line)
-            f.close()
+    # Collects what each node logged since the last call (for the same path) into path; see LogCollector.
+    def outputLogs(self, path="/src/tmp", compress=False):
+        LogCollector(path, compress).collect(list(self.node_containers.values()))
 
     def zkDump(self, path="/src/tmp", zk_client=None, stop_zk=True):
         if not os.path.exists(path):
             os.makedirs(path)
         if not zk_client:
             zk_client = get_zookeeper_client(self.ensemble)
-        zk_table_configs = [
-            ZkTableConfiguration(
-                outfile = "config.out", 
-                zk_path = "/zookeeper/config", 
-                proto = "string", 
-                is_leaf = True),
-            ZkTableConfiguration(
-                outfile = "quota.out", 
-                zk_path = "/zookeeper/quota", 
-                proto = "string", 
-                is_leaf = True),
-            ZkTableConfiguration(
-                outfile = "coordinatorClusterClock.out", 
-                zk_path = "/ramcloud/main/coordinatorClusterClock", 
-                proto = CoordinatorClusterClock_pb2.CoordinatorClusterClock(), 
-                is_leaf = True),
-            ZkTableConfiguration(
-                outfile = "tables.out", 
-                zk_path = "/ramcloud/main/tables", 
-                proto = Table_pb2.Table(), 
-                is_leaf = False),
-            ZkTableConfiguration(
-                outfile = "tableManager.out", 
-                zk_path = "/ramcloud/main/tableManager", 
-                proto = TableManager_pb2.TableManager(), 
-                is_leaf = True),
-            ZkTableConfiguration(
-                outfile = "coordinator.out", 
-                zk_path = "/ramcloud/main/coordinator", 
-                proto = "string", 
-                is_leaf = True),
-            ZkTableConfiguration(
-                outfile = "servers.out", 
-                zk_path = "/ramcloud/main/servers", 
-                proto = ServerListEntry_pb2.ServerListEntry(), 
-                is_leaf = False),
-            ZkTableConfiguration(
-                outfile = "coordinatorUpdateManager.out", 
-                zk_path = "/ramcloud/main/coordinatorUpdateManager", 
-                proto = CoordinatorUpdateInfo_pb2.CoordinatorUpdateInfo(), 
-                is_leaf = True),
-            ZkTableConfiguration(
-                outfile = "clientLeaseAuthority.out", 
-                zk_path = "/ramcloud/main/clientLeaseAuthority", 
-                proto = "string", 
-                is_leaf = False),
-        ]
-        for zk_table_config in zk_table_configs:
-            zk_table_config.dump(path, zk_client)
-        if stop_zk:
+        try:
+            for zk_table_config in zk_table_configs:
+                zk_table_config.dump(path, zk_client)
+        finally:
+            if stop_zk:
+                zk_client.stop()
+
+    # Returns a ZkSnapshot of everything zkDump would write out.
+    def zkSnapshot(self):
+        zk_client = get_zookeeper_client(self.ensemble)
+        try:
+            return ZkSnapshot(zk_client)
+        finally:
             zk_client.stop()
 
-    def tearDown(self):
-        for (_, container) in list(self.node_containers.items()):
-            container.remove(force=True)
-        self.ramcloud_network.remove()
+    def tearDown(self, keep = False):
+        if keep:
+            return
+        self.stopTopology()
+        remove_containers(list(getattr(self, 'node_containers', {}).values()))
+        self.node_containers = {}
+        if getattr(self, 'ramcloud_network', None):
+            self.ramcloud_network.remove()
+            self.ramcloud_network = None
 
 class ZkTableConfiguration:
+    # How many gets to keep in flight at once while reading the children of a node
+    max_outstanding = 256
+
     def __init__(self, outfile, zk_path, proto, is_leaf):
+        # proto names the generated message class to decode nodes into, as "Module_pb2.Message", which is
+        # only imported once a node is decoded; or it's the string "string" for nodes that just hold text
         self.outfile = outfile
         self.zk_path = zk_path
         self.proto = proto
         self.is_leaf = is_leaf
 
+    def message_class(self):
+        module, message = self.proto.split('.')
+        return getattr(importlib.import_module(module), message)
+
+    def decode(self, data):
+        if self.proto == "string":
+            return data.decode()
+        item = self.message_class()()
+        item.ParseFromString(data)
+        return item
+
+    def fetch(self, zk_client):
+        # Generates (zk_path, decoded node) for this configuration, in order, with up to max_outstanding
+        # get_async calls in flight rather than one synchronous get per child. Yields nothing if zk_path
+        # doesn't exist; children removed while we read are skipped.
+        import kazoo.exceptions
+        try:
+            zk_paths = [self.zk_path]
+            if not self.is_leaf:
+                zk_paths = ["%s/%s" % (self.zk_path, child) for child in sorted(zk_client.get_children(self.zk_path))]
+        except kazoo.exceptions.NoNodeError:
+            return
+        pending = collections.deque()
+        for zk_path in zk_paths:
+            pending.append((zk_path, zk_client.get_async(zk_path)))
+            if len(pending) >= self.max_outstanding:
+                yield from self._collect(pending.popleft())
+        while pending:
+            yield from self._collect(pending.popleft())
+
+    def _collect(self, request):
+        import kazoo.exceptions
+        zk_path, result = request
+        try:
+            data = result.get()[0]
+        except kazoo.exceptions.NoNodeError:
+            return
+        yield (zk_path, self.decode(data))
+
     def getTable(self, zk_client):
-        # TODO: Find a way to combine this method and dump(). This is non-intuitive at moment.
+        # If the zk_path doesn't exist, return None rather than an empty list.
         if not zk_client.exists(self.zk_path):
             return None
-        zk_paths = [self.zk_path]
-        if not self.is_leaf:
-            zk_paths = ["%s/%s" % (self.zk_path, child) for child in zk_client.get_children(self.zk_path)]
-        items = []
-        for zk_path in zk_paths:
-            data = zk_client.get(zk_path)[0]
-            item = ""
-            if type(self.proto) is str:
-                item = data
-            else:
-                item = copy.deepcopy(self.proto)
-                item.ParseFromString(data)
-            items.append(item)
-        return items
+        return [item for (_, item) in self.fetch(zk_client)]
 
-    def dump(self, outpath, zk_client):
+    def dump(self, outpath, zk_client, items=None):
+        # Writes out each node as it arrives. items, a sequence of (zk_path, decoded node), may be given to
+        # write out nodes already fetched, e.g. from a ZkSnapshot.
         # If the zk_path doesn't exist, then don't output anything. That's not an error.
         # "/ramcloud/main/tableManager" doesn't always exist, for example.
-        if not zk_client.exists(self.zk_path):
-            return
-        zk_paths = [self.zk_path]
-        if not self.is_leaf:
-            zk_paths = ["%s/%s" % (self.zk_path, child) for child in zk_client.get_children(self.zk_path)]
+        from google.protobuf import text_format
+        if items is None:
+            if not zk_client.exists(self.zk_path):
+                return
+            items = self.fetch(zk_client)
         outfile_complete = "%s/%s" % (outpath, self.outfile)
-        f = open(outfile_complete, 'w')
-        for zk_path in zk_paths:
-            data = zk_client.get(zk_path)[0]
-            outstring = ""
-            if type(self.proto) is str:
-                outstring = data.decode()
+        with open(outfile_complete, 'w') as f:
+            for (zk_path, item) in items:
+                outstring = item if self.proto == "string" else text_format.MessageToString(item)
+                liner = "%s ==>\n"%zk_path
+                f.write(liner)
+                f.write(outstring)
+                f.write('\n')
+
+class ZkSnapshot:
+    # A typed, in-memory copy of the ZooKeeper nodes described by a list of ZkTableConfigurations, all
+    # fetched concurrently. snapshot.nodes[zk_path] maps each node read under that configuration's
+    # zk_path to its decoded value.
+    def __init__(self, zk_client, configs=None):
+        self.configs = zk_table_configs if configs is None else configs
+        self.nodes = {config.zk_path : collections.OrderedDict(config.fetch(zk_client)) for config in self.configs}
+
+    def items(self, config):
+        return list(self.nodes[config.zk_path].values())
+
+    def servers(self):
+        return self.items(servers_config)
+
+    def tables(self):
+        return self.items(tables_config)
+
+    def dump(self, outpath):
+        if not os.path.exists(outpath):
+            os.makedirs(outpath)
+        for config in self.configs:
+            if self.nodes[config.zk_path]:
+                config.dump(outpath, None, self.nodes[config.zk_path].items())
+
+# A server as last seen in /ramcloud/main/servers. server_id is the full id, as ServerListEntry holds it:
+# index is its slot in the coordinator's server list and generation counts how often the slot was reused.
+class ServerInfo(collections.namedtuple('ServerInfo', ['server_id', 'service_locator', 'services', 'status'])):
+    __slots__ = ()
+
+    @property
+    def index(self):
+        return self.server_id & 0xffffffff
+
+    @property
+    def generation(self):
+        return self.server_id >> 32
+
+    @property
+    def host(self):
+        return get_host(self.service_locator)
+
+    @property
+    def is_up(self):
+        return self.status == server_status_up
+
+    def has_service(self, service):
+        return bool(self.services & (1 << service))
+
+# A change seen by a ClusterTopology: kind is 'added', 'changed' or 'removed', with server and previous the
+# ServerInfo after and before it (None where there isn't one), or 'coordinator', with coordinator the new
+# coordinator locator (None while there isn't one).
+TopologyEvent = collections.namedtuple('TopologyEvent', ['kind', 'server', 'previous', 'coordinator'])
+
+# A live view of the cluster's membership, kept current by zk watches on /ramcloud/main/servers (and each
+# server under it) and on /ramcloud/main/coordinator rather than by polling, so it's never stale the way a
+# one-off ZkSnapshot gets when servers crash or re-enlist. kazoo makes the first call of each watch as it's
+# set, so a new ClusterTopology already holds the whole server list.
+#
+# >>> topology = ctu.ClusterTopology(x.ensemble)
+# >>> topology.subscribe(print)    # called with each TopologyEvent, on kazoo's event thread
+# >>> topology.wait_for('server 2 to crash', lambda t: not t.server(2).is_up)
+# >>> topology.stop()
+class ClusterTopology:
+    def __init__(self, ensemble):
+        self.zk_client = get_zookeeper_client(ensemble)
+        self.changed = threading.Condition()
+        self._servers = {}  # zk node name -> ServerInfo
+        self._watched = set()  # zk node names with a DataWatch on them
+        self._children_watch = None
+        self._coordinator = None
+        self._callbacks = []
+        self._stopped = False
+        self.zk_client.DataWatch(servers_config.zk_path, self._on_servers_node)
+        self.zk_client.DataWatch('/ramcloud/main/coordinator', self._on_coordinator)
+
+    def stop(self):
+        with self.changed:
+            self._stopped = True
+            self.changed.notify_all()
+        self.zk_client.stop()
+        self.zk_client.close()
+
+    # Calls callback(event) with every TopologyEvent from now on.
+    def subscribe(self, callback):
+        with self.changed:
+            self._callbacks.append(callback)
+
+    def unsubscribe(self, callback):
+        with self.changed:
+            self._callbacks.remove(callback)
+
+    def servers(self):
+        # Every server in the server list, crashed ones included, by index
+        with self.changed:
+            return sorted(self._servers.values(), key=lambda s: s.index)
+
+    def server(self, server_id):
+        # The server with server_id, or None if it isn't (or is no longer) in the list
+        return next((s for s in self.servers() if s.server_id == server_id), None)
+
+    def up_server_on(self, host):
+        # The server currently up on host, or None
+        return next((s for s in self.servers() if s.host == host and s.is_up), None)
+
+    def coordinator(self):
+        with self.changed:
+            return self._coordinator
+
+    def backup_candidates(self, master_server_id, window = 1):
+        # The backups the plus-one (or, with window > 1, plus-K) selector of master_server_id picks its
+        # replicas from right now: the first window servers up with a backup service after the master in
+        # server list order, wrapping around, as the selectors walk the list. Re-replication after a backup
+        # crashes picks from the same list, so this stays right as servers die and re-enlist.
+        servers = [s for s in self.servers() if s.is_up and s.has_service(backup_service)]
+        master_index = master_server_id & 0xffffffff
+        after = [s for s in servers if s.index > master_index] + [s for s in servers if s.index < master_index]
+        return [s.server_id for s in after[:window]]
+
+    def plus_one_backup_id(self, master_server_id):
+        candidates = self.backup_candidates(master_server_id)
+        if not candidates:
+            raise LookupError('no backup is up for server {}'.format(master_server_id))
+        return candidates[0]
+
+    # Blocks until predicate(self) holds, rechecking it as soon as the topology changes.
+    def wait_for(self, what, predicate, timeout = 120):
+        logger.info('Waiting for %s...', what)
+        deadline = time.time() + timeout
+        with self.changed:
+            while not predicate(self):
+                remaining = deadline - time.time()
+                if self._stopped or remaining <= 0:
+                    raise TimeoutError('Timed out after {}s waiting for {}'.format(timeout, what))
+                self.changed.wait(remaining)
+        logger.info('Waiting for %s...done', what)
+
+    def _on_servers_node(self, data, stat):
+        # A ChildrenWatch gives up on a node that doesn't exist, so it's only made once the coordinator has
+        # created /ramcloud/main/servers
+        if self._stopped:
+            return False
+        if stat is not None and self._children_watch is None:
+            self._children_watch = self.zk_client.ChildrenWatch(servers_config.zk_path, self._on_children)
+        return self._children_watch is None
+
+    def _on_children(self, children):
+        if self._stopped:
+            return False
+        with self.changed:
+            added = set(children) - self._watched
+            self._watched |= added
+        for name in sorted(added):
+            self.zk_client.DataWatch('{}/{}'.format(servers_config.zk_path, name), self._server_watcher(name))
+        return True
+
+    def _server_watcher(self, name):
+        # kazoo passes the watch event too to functions taking a third argument, so name can't be one
+        return lambda data, stat: self._on_server(name, data)
+
+    def _on_server(self, name, data):
+        if self._stopped:
+            return False
+        server = None
+        if data is not None:
+            entry = servers_config.decode(data)
+            server = ServerInfo(entry.server_id, entry.service_locator, entry.services, entry.status)
+        with self.changed:
+            previous = self._servers.pop(name, None)
+            if server is not None:
+                self._servers[name] = server
             else:
-                outproto = copy.deepcopy(self.proto)
-                outproto.ParseFromString(data)
-                outstring = text_format.MessageToString(outproto)
-            liner = "%s ==>\n"%zk_path
-            f.write(liner)
-            f.write(outstring)
-            f.write('\n')
-        f.close()
+                self._watched.discard(name)
+        if server != previous:
+            kind = 'added' if previous is None else 'removed' if server is None else 'changed'
+            self._notify(TopologyEvent(kind, server, previous, None))
+        # a deleted node's watch ends here; a new server enlisting under the same name gets a new one
+        return server is not None
+
+    def _on_coordinator(self, data, stat):
+        if self._stopped:
+            return False
+        coordinator = data.decode() if data else None
+        with self.changed:
+            changed = coordinator != self._coordinator
+            self._coordinator = coordinator
+        if changed:
+            self._notify(TopologyEvent('coordinator', None, None, coordinator))
+        return True
+
+    def _notify(self, event):
+        # Callbacks go first, so that a wait_for woken by this change sees what they did with it
+        with self.changed:
+            callbacks = list(self._callbacks)
+        for callback in callbacks:
+            try:
+                callback(event)
+            except Exception:
+                logger.exception('Topology callback %s failed on %s', callback, event)
+        with self.changed:
+            self.changed.notify_all()
+
+tables_config = ZkTableConfiguration(
+    outfile = "tables.out",
+    zk_path = "/ramcloud/main/tables",
+    proto = "Table_pb2.Table",
+    is_leaf = False)
+
+servers_config = ZkTableConfiguration(
+    outfile = "servers.out",
+    zk_path = "/ramcloud/main/servers",
+    proto = "ServerListEntry_pb2.ServerListEntry",
+    is_leaf = False)
+
+# Everything zkDump and output_zk_detached write out
+zk_table_configs = [
+    ZkTableConfiguration(
+        outfile = "config.out",
+        zk_path = "/zookeeper/config",
+        proto = "string",
+        is_leaf = True),
+    ZkTableConfiguration(
+        outfile = "quota.out",
+        zk_path = "/zookeeper/quota",
+        proto = "string",
+        is_leaf = True),
+    ZkTableConfiguration(
+        outfile = "coordinatorClusterClock.out",
+        zk_path = "/ramcloud/main/coordinatorClusterClock",
+        proto = "CoordinatorClusterClock_pb2.CoordinatorClusterClock",
+        is_leaf = True),
+    tables_config,
+    ZkTableConfiguration(
+        outfile = "tableManager.out",
+        zk_path = "/ramcloud/main/tableManager",
+        proto = "TableManager_pb2.TableManager",
+        is_leaf = True),
+    ZkTableConfiguration(
+        outfile = "coordinator.out",
+        zk_path = "/ramcloud/main/coordinator",
+        proto = "string",
+        is_leaf = True),
+    servers_config,
+    ZkTableConfiguration(
+        outfile = "coordinatorUpdateManager.out",
+        zk_path = "/ramcloud/main/coordinatorUpdateManager",
+        proto = "CoordinatorUpdateInfo_pb2.CoordinatorUpdateInfo",
+        is_leaf = True),
+    ZkTableConfiguration(
+        outfile = "clientLeaseAuthority.out",
+        zk_path = "/ramcloud/main/clientLeaseAuthority",
+        proto = "string",
+        is_leaf = False),
+]
@@ -0,0 +1,197 @@
+import argparse
+import json
+import multiprocessing
+import random
+import time
+
+import cluster_test_utils as ctu
+import ramcloud
+
+# Measures how transport timeout settings trade failure detection latency
+# against false failure detections.
+#
+# BasicTransport checks its rpcs every timer interval (2 ms): an rpc that has
+# heard nothing from the other end for --pingIntervals intervals pings it,
+# and one that has heard nothing for --timeoutIntervals intervals fails, which
+# leads the coordinator to check the server and, if it doesn't answer, start
+# a recovery. Small values detect crashes sooner, but then a server that just
+# stalls for a while (a GC pause in a client, hugepage compaction, a noisy
+# neighbour) is declared dead and needlessly recovered.
+#
+# For each setting, this brings up a fresh cluster with a writer process per
+# server keeping rpcs flowing, then:
+#
+#   stalls:      stops the rc-server of a master with SIGSTOP for --stall-ms,
+#                --stalls times, and counts false_positives: stalls after
+#                which the server was no longer up in the coordinator's
+#                server list. The cluster is rebuilt after each of them.
+#   crash:       kills the rc-server of a master with SIGKILL and measures
+#                detect_s, the time until the coordinator marks it crashed,
+#                and first_read_s, until a key it mastered can be read again.
+#
+# Each --timeout-intervals value runs with --pingIntervals set to
+# --ping-intervals, or to one less than the timeout if that's smaller, since a
+# ping after the timeout is never sent.
+#
+# Example, from the dev-env container:
+#
+#   python3 testing/failure_detection_benchmark.py --timeout-intervals 10 40 \
+#       --ping-intervals 3 --stall-ms 50 -o /src/tmp/failure-detection.jsonl
+
+timer_interval_ms = 2.0  # BasicTransport's timerInterval
+
+def record_key(n):
+    return 'k%d' % n
+
+def connect(ensemble):
+    rc = ramcloud.RAMCloud()
+    rc.connect('zk:' + ctu.external_storage_string(ensemble), 'main')
+    return rc
+
+def write_keys(rc, table, records):
+    for start in range(0, records, 1000):
+        rc.multi_write(table, [(record_key(n), 'x' * 100, None) for n in range(start, min(start + 1000, records))])
+
+def keys_by_master(rc, table, records):
+    # Groups the keys of table by the host of their master
+    masters = {}
+    for n in range(records):
+        host = ctu.get_host(rc.testing_get_service_locator(table, record_key(n)))
+        masters.setdefault(host, []).append(record_key(n))
+    return masters
+
+def keep_writing(ensemble, table, records, stop, seed):
+    # Writes random keys until stop is set, so that every server always has rpcs in flight
+    rc = connect(ensemble)
+    rng = random.Random(seed)
+    while not stop.is_set():
+        try:
+            rc.write(table, record_key(rng.randrange(records)), 'y' * 100)
+        except Exception:
+            time.sleep(0.01)
+
+class Trial:
+    # A cluster running with one timeout setting, with writers keeping it busy
+    def __init__(self, args, options):
+        self.args = args
+        self.options = options
+        self.x = ctu.ClusterTest()
+        self.writers = []
+        self.stop = multiprocessing.Event()
+
+    def start(self):
+        self.x.setUp(num_nodes = self.args.nodes, server_options = self.options)
+        self.x.rc_client.create_table('detect', self.args.nodes)
+        self.table = self.x.rc_client.get_table_id('detect')
+        write_keys(self.x.rc_client, self.table, self.args.records)
+        self.stop.clear()
+        self.writers = [multiprocessing.Process(target=keep_writing,
+                                                args=(self.x.ensemble, self.table, self.args.records, self.stop, s))
+                        for s in range(self.args.nodes)]
+        for p in self.writers:
+            p.start()
+
+    def stop_writers(self):
+        self.stop.set()
+        for p in self.writers:
+            p.join()
+        self.writers = []
+
+    def victim(self):
+        # The host and server id of the master of the first key
+        host = ctu.get_host(self.x.rc_client.testing_get_service_locator(self.table, record_key(0)))
+        return host, self.x.topology.up_server_on(host).server_id
+
+    def server_up(self, server_id):
+        server = self.x.topology.server(server_id)
+        return server is not None and server.is_up
+
+    def stall(self):
+        # Pauses a master for --stall-ms; returns whether it was wrongly declared dead
+        host, server_id = self.victim()
+        self.x.killProcess(host, 'rc-server', 'SIGSTOP')
+        time.sleep(self.args.stall_ms / 1000)
+        self.x.killProcess(host, 'rc-server', 'SIGCONT')
+        time.sleep(self.args.settle_seconds)
+        return not self.server_up(server_id)
+
+    def crash(self):
+        # Kills a master; returns (seconds until it's marked crashed, seconds until its keys are readable)
+        host, server_id = self.victim()
+        killed_at = time.time()
+        self.x.killProcess(host, 'rc-server', 'SIGKILL')
+        # the topology hears of the crash from a zk watch, so this returns within milliseconds of it
+        self.x.topology.wait_for('server %d to be marked crashed' % server_id,
+                                 lambda t: not self.server_up(server_id), timeout = 300)
+        detect_s = time.time() - killed_at
+        connect(self.x.ensemble).read(self.table, record_key(0))
+        return detect_s, time.time() - killed_at
+
+    def tearDown(self):
+        self.stop_writers()
+        self.x.tearDown()
+
+def run(args, ping, timeout):
+    args_string = '{} --pingIntervals {} --timeoutIntervals {}'.format(args.server_args, ping, timeout).strip()
+    options = ctu.default_server_options._replace(args = args_string)
+    trial = Trial(args, options)
+    false_positives = 0
+    try:
+        trial.start()
+        for _ in range(args.stalls):
+            if trial.stall():
+                false_positives += 1
+                trial.tearDown()
+                trial.start()
+        detect_s, first_read_s = trial.crash()
+    finally:
+        trial.tearDown()
+
+    return {
+        'ping_intervals': ping,
+        'timeout_intervals': timeout,
+        'timeout_ms': timeout * timer_interval_ms,
+        'nodes': args.nodes,
+        'server_args': args.server_args,
+        'stall_ms': args.stall_ms,
+        'stalls': args.stalls,
+        'false_positives': false_positives,
+        'detect_s': round(detect_s, 3),
+        'first_read_s': round(first_read_s, 3),
+    }
+
+def timeout_intervals(text):
+    if not (text.isdigit() and int(text) > 1):
+        raise argparse.ArgumentTypeError("expected a number of intervals above 1, got %r" % text)
+    return int(text)
+
+if __name__ == '__main__':
+    # We list all argument default values as part of the "help menu"
+    parser = argparse.ArgumentParser(formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+    parser.add_argument('--timeout-intervals', type=timeout_intervals, nargs='+', default=[10, 40],
+                        help="rc-server --timeoutIntervals values; one run per value")
+    parser.add_argument('--ping-intervals', type=int, default=3,
+                        help="rc-server --pingIntervals, capped at one less than each --timeout-intervals value")
+    parser.add_argument('--nodes', '-n', type=int, default=4,
+                        help="Number of nodes in the cluster")
+    parser.add_argument('--server-args', type=str, default='',
+                        help="Extra rc-server arguments")
+    parser.add_argument('--records', type=int, default=10000,
+                        help="Number of keys spread over the servers")
+    parser.add_argument('--stall-ms', type=float, default=50.0,
+                        help="How long to stop a server for")
+    parser.add_argument('--stalls', type=int, default=5,
+                        help="Number of stalls to inject before the crash")
+    parser.add_argument('--settle-seconds', type=float, default=2.0,
+                        help="Seconds to wait after a stall before checking whether the server was declared dead")
+    parser.add_argument('--output', '-o', type=str, default=None,
+                        help="File to append a JSON line per run to")
+    args = parser.parse_args()
+
+    for timeout in args.timeout_intervals:
+        result = run(args, min(args.ping_intervals, timeout - 1), timeout)
+        line = json.dumps(result, sort_keys=True)
+        print(line)
+        if args.output:
+            with open(args.output, 'a') as f:
+                f.write(line + '\n')
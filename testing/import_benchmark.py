@@ -0,0 +1,87 @@
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+# Measures how long the testing modules take to import, which is most of what a ramcloud_test_cluster.py
+# invocation costs before it does anything, so that heavy imports creeping back into module scope show up.
+#
+# For each --modules entry, this runs a fresh interpreter that just imports it, --repeat times, and reports
+# the wall time in milliseconds over that of an interpreter that imports nothing (median and min), plus the
+# heavy modules it pulled in and whether libramcloud.so got loaded. With --top, it also reruns the import under -X importtime and lists the slowest
+# imports by their own time. Each result is printed as a line of JSON and, with -o, appended to a file.
+#
+# Example, from the dev-env container:
+#
+#   python3 testing/import_benchmark.py --top 10 -o /src/tmp/imports.jsonl
+
+here = os.path.dirname(os.path.abspath(__file__))
+
+# Modules whose import means one of the heavy dependencies was loaded
+heavy_modules = ['docker', 'kazoo', 'ramcloud', 'google.protobuf']
+
+def interpreter_ms(code):
+    start = time.perf_counter()
+    subprocess.run([sys.executable, '-c', code], cwd=here, check=True)
+    return (time.perf_counter() - start) * 1000
+
+# Returns the heavy modules other than module itself that importing it loads, and whether libramcloud.so was
+# mapped into the interpreter, which the ramcloud binding should only do once a client connects
+def loaded_heavy_modules(module):
+    code = ('import sys, {}; print(" ".join(sorted(sys.modules))); '
+            'print("libramcloud.so" in open("/proc/self/maps").read())').format(module)
+    modules, so_loaded = subprocess.run([sys.executable, '-c', code], cwd=here, check=True,
+                                        stdout=subprocess.PIPE, universal_newlines=True).stdout.splitlines()
+    loaded = modules.split()
+    return [m for m in heavy_modules if m in loaded and m != module], so_loaded == 'True'
+
+def slowest_imports(module, top):
+    # -X importtime writes "import time: self [us] | cumulative | imported package" lines to stderr
+    stderr = subprocess.run([sys.executable, '-X', 'importtime', '-c', 'import ' + module], cwd=here, check=True,
+                            stderr=subprocess.PIPE, universal_newlines=True).stderr
+    times = []
+    for line in stderr.splitlines():
+        fields = [f.strip() for f in line[len('import time:'):].split('|')]
+        if line.startswith('import time:') and fields[0].isdigit():
+            times.append((int(fields[0]), fields[2]))
+    return [{'module': name, 'self_ms': round(us / 1000, 2)} for (us, name) in sorted(times, reverse=True)[:top]]
+
+def run(args, module, baseline):
+    samples = [interpreter_ms('import ' + module) - baseline for _ in range(args.repeat)]
+    heavy, so_loaded = loaded_heavy_modules(module)
+    result = {
+        'module': module,
+        'repeat': args.repeat,
+        'median_ms': round(statistics.median(samples), 2),
+        'min_ms': round(min(samples), 2),
+        'heavy_modules': heavy,
+        'libramcloud_loaded': so_loaded,
+    }
+    if args.top:
+        result['slowest'] = slowest_imports(module, args.top)
+    return result
+
+if __name__ == '__main__':
+    # We list all argument default values as part of the "help menu"
+    parser = argparse.ArgumentParser(formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+    parser.add_argument('--modules', '-m', type=str, nargs='+', default=['cluster_test_utils', 'ramcloud_test_cluster', 'ramcloud'],
+                        help="Modules to time the import of; one run per module")
+    parser.add_argument('--repeat', '-r', type=int, default=10,
+                        help="Number of fresh interpreters to time per module")
+    parser.add_argument('--top', type=int, default=0,
+                        help="Also list this many of the slowest imports under each module")
+    parser.add_argument('--output', '-o', type=str, default=None,
+                        help="File to append a JSON line per run to")
+    args = parser.parse_args()
+
+    baseline = statistics.median(interpreter_ms('pass') for _ in range(args.repeat))
+    for module in args.modules:
+        result = run(args, module, baseline)
+        line = json.dumps(result, sort_keys=True)
+        print(line)
+        if args.output:
+            with open(args.output, 'a') as f:
+                f.write(line + '\n')
@@ -1,6 +1,9 @@
 import cluster_test_utils as ctu
 import argparse
+import shlex
 import sys
+import time
+import traceback
 
 # If you're trying to make fake data in RAMCloud, this works from Python3 interpreter,
 # assuming you started up the default 3-node test cluster:
@@ -13,16 +16,31 @@ import sys
 # >>> tid = rc.get_table_id('test')
 # >>> rc.write(tid, 'testKey', 'testValue')
 # >>> rc.read(tid, 'testKey')
+#
+# Several actions can be given at once, and are run in order in the one process, e.g.
+#
+#   python3 testing/ramcloud_test_cluster.py -a stop start status
+#
+# With --batch, commands are instead read from stdin, one per line, each with the same arguments as this
+# script takes (e.g. "-a log -p /src/tmp/run1"). After each command a line "-- ok <command>" or
+# "-- failed <command>" is printed, so a script can keep one instance running as a coprocess and issue
+# commands to it without paying for interpreter startup and imports every time.
 
-if __name__ == '__main__':
+actions = ['status', 'reset', 'log', 'follow', 'start', 'stop']
+
+def make_parser():
     # We list all argument default values as part of the "help menu"
     parser = argparse.ArgumentParser(formatter_class=argparse.ArgumentDefaultsHelpFormatter)
-    parser.add_argument('--action', '-a', metavar='A', type=str, default="status",
-                        help="Defines the action to take, which is one of: status reset log start stop")
+    parser.add_argument('--action', '-a', metavar='A', type=str, nargs='+', default=["status"], choices=actions,
+                        help="Defines the actions to take, in order, each one of: " + ' '.join(actions))
     parser.add_argument('--nodes', '-n', type=int, default=3,
                         help="Number of zk, rc-coordinator, and rc-server instances to bring up. Only relevant when there's no cluster up yet.")
     parser.add_argument('--path', '-p', type=str, default="/src/tmp",
                         help="Path to place logs in when action is set to \"log\"")
+    parser.add_argument('--compress', action='store_true',
+                        help="Gzip the logs written by the \"log\" and \"follow\" actions")
+    parser.add_argument('--max-log-bytes', type=int, default=0,
+                        help="With the \"follow\" action, rotate each log file once it reaches this size (0 never rotates)")
     parser.add_argument('--cidr', '-c', type=str, default="169.254.3.0/24",
                         help="IPv4 CIDR to use for the docker network, docker nodes, and zk ensemble in the RAMCloud test cluster. "
                              "NOTE that only CIDR notations of /24 or /16 are supported at the moment in this program.")
@@ -32,57 +50,99 @@ if __name__ == '__main__':
                              "NETWORK is the name of the docker network to create (not an IP address), "
                              "and NODE is the prefix to use for the names of the docker containers corresponding to the nodes, and "
                              "appears as NODE-1, NODE-2, NODE-3, etc.")
+    parser.add_argument('--batch', action='store_true',
+                        help="Read commands from stdin, one per line, and run each in turn until end of input")
+    return parser
+
+def run_action(action, args):
+    if (action == "start"):
+        x = ctu.ClusterTest()
+        x.setUp(num_nodes = args.nodes)
+    elif (action == "status"):
+        ctu.get_status()
+    elif (action == "stop"):
+        docker_network, docker_containers = ctu.get_status()
+        ctu.destroy_network_and_containers(docker_network, docker_containers)
+    elif (action == "log"):
+        docker_network, docker_containers = ctu.get_status()
+        if (not docker_network or not docker_containers):
+            print("No network or containers currently up to log")
+            return
+        ensemble = ctu.get_ensemble(len(docker_containers))
+        ctu.output_logs_detached(docker_containers, args.path, args.compress)
+        ctu.output_zk_detached(ensemble, args.path)
+    elif (action == "follow"):
+        docker_network, docker_containers = ctu.get_status()
+        if (not docker_containers):
+            print("No containers currently up to follow")
+            return
+        collector = ctu.LogCollector(args.path, args.compress, args.max_log_bytes)
+        collector.follow(docker_containers)
+        print("Following logs into", args.path, "until interrupted")
+        try:
+            while True:
+                time.sleep(1)
+        except KeyboardInterrupt:
+            collector.stop()
+    elif (action == "reset"):
+        docker_network, docker_containers = ctu.get_status()
+        if (not docker_network):
+            # No network (or containers), means bring up new cluster
+            print("Bringing up new cluster with ", args.nodes, " nodes")
+            x = ctu.ClusterTest()
+            x.setUp(num_nodes = args.nodes)
+        elif (not docker_containers):
+            # A network but no containers means no data, so take it down, & bring back up
+            print("Inconsistent State")
+            print("Bringing up new cluster with ", args.nodes, " nodes")
+            ctu.destroy_network_and_containers(docker_network, [])
+            x = ctu.ClusterTest()
+            x.setUp(num_nodes = args.nodes)
+        else:
+            # We have a network and containers. Get the ensemble, table names, then drop all tables!
+            print("Found a cluster with ", len(docker_containers), " nodes")
+            print("Identifying tables")
+            ensemble = ctu.get_ensemble(len(docker_containers))
+            table_names = ctu.get_table_names(ensemble)
+            print("Table names = ", table_names)
+            print("Dropping all tables")
+            ctu.drop_tables(ensemble, table_names)
 
-args = parser.parse_args()
+def run(args):
+    print("action =",' '.join(args.action))
+    print("nodes =",args.nodes)
+    print("path =",args.path)
 
-print("action =",args.action)
-print("nodes =",args.nodes)
-print("path =",args.path)
+    ctu.set_cluster_cidr(args.cidr)
+    ctu.set_docker_names(args.docker_names)
 
-ctu.set_cluster_cidr(args.cidr)
-ctu.set_docker_names(args.docker_names)
+    print("cidr = {}.0/{}".format(ctu.cluster_ip_prefix, ctu.cluster_notation))
+    print("docker_names = {},{},{}".format(ctu.docker_image_name, ctu.docker_network_name, ctu.docker_node_prefix))
 
-print("cidr = {}.0/{}".format(ctu.cluster_ip_prefix, ctu.cluster_notation))
-print("docker_names = {},{},{}".format(ctu.docker_image_name, ctu.docker_network_name, ctu.docker_node_prefix))
+    for action in args.action:
+        run_action(action, args)
 
-if (args.action == "start"):
-    x = ctu.ClusterTest()
-    x.setUp(num_nodes = args.nodes)
-elif (args.action == "status"):
-    ctu.get_status()
-elif (args.action == "stop"):
-    docker_network, docker_containers = ctu.get_status()
-    ctu.destroy_network_and_containers(docker_network, docker_containers)
-elif (args.action == "log"):
-    docker_network, docker_containers = ctu.get_status()
-    if (not docker_network or not docker_containers):
-        print("No network or containers currently up to log")
-        exit()
-    ensemble = ctu.get_ensemble(len(docker_containers))
-    ctu.output_logs_detached(docker_containers, args.path)
-    ctu.output_zk_detached(ensemble, args.path)
-elif (args.action == "reset"):
-    docker_network, docker_containers = ctu.get_status()
-    if (not docker_network):
-        # No network (or containers), means bring up new cluster
-        print("Bringing up new cluster with ", args.nodes, " nodes")
-        x = ctu.ClusterTest()
-        x.setUp(num_nodes = args.nodes)
-    elif (not docker_containers):
-        # A network but no containers means no data, so take it down, & bring back up
-        print("Inconsistent State")
-        print("Bringing up new cluster with ", args.nodes, " nodes")
-        ctu.destroy_network_and_containers(docker_network, [])
-        x = ctu.ClusterTest()
-        x.setUp(num_nodes = args.nodes)
+def run_batch(parser):
+    for line in sys.stdin:
+        command = line.strip()
+        if not command or command.startswith('#'):
+            continue
+        ok = False
+        try:
+            args = parser.parse_args(shlex.split(command))
+            run(args)
+            ok = True
+        except SystemExit:
+            # argparse exits on bad arguments (or --help); that only ends this command
+            pass
+        except Exception:
+            traceback.print_exc()
+        print("-- {} {}".format('ok' if ok else 'failed', command), flush=True)
+
+if __name__ == '__main__':
+    parser = make_parser()
+    args = parser.parse_args()
+    if args.batch:
+        run_batch(parser)
     else:
-        # We have a network and containers. Get the ensemble, table names, then drop all tables!
-        print("Found a cluster with ", len(docker_containers), " nodes")
-        print("Identifying tables")
-        ensemble = ctu.get_ensemble(len(docker_containers))
-        table_names = ctu.get_table_names(ensemble)
-        print("Table names = ", table_names)
-        print("Dropping all tables")
-        ctu.drop_tables(ensemble, table_names)
-else:
-    parser.print_help()
+        run(args)
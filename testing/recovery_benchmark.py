@@ -0,0 +1,229 @@
+import argparse
+import itertools
+import json
+import multiprocessing
+import random
+import sys
+import time
+
+import cluster_test_utils as ctu
+import ramcloud
+
+# Measures how long data is unavailable after an rc-server crashes.
+#
+# For every combination of data size, node count, --replicas,
+# --usePlusOneBackup and --plusOneBackupWindow given on the command line
+# (comparing windows of 1 and of several servers shows what striping the
+# backups of a master buys), this brings up a fresh
+# cluster, preloads the data spread over several tables, kills the rc-server
+# of a master (or of a backup of it) with SIGKILL and measures:
+#
+#   first_read_s:   time from the kill until a read of a key on the crashed
+#                   master succeeds. RAMCloud clients retry reads of a crashed
+#                   master until its tablets are recovered, so this is how
+#                   long that master's keys are unavailable.
+#   all_readable_s: time from the kill until every preloaded key, in every
+#                   table, has been read back with its value intact.
+#   recovery_ops:   reads per second of random keys across all tables, by
+#                   --readers processes, from the kill until all_readable_s;
+#                   baseline_ops is the same rate measured before the kill.
+#
+# Each result is printed as a line of JSON and, with -o, appended to a file,
+# so runs can be collected and compared against a recovery SLO.
+#
+# Example, from the dev-env container:
+#
+#   python3 testing/recovery_benchmark.py --data-mb 100 1000 --replicas 1 2 \
+#       --server-args='--totalMasterMemory 4000' -o /src/tmp/recovery.jsonl
+#
+# Bigger data sizes need masters with more memory than the rc-server default,
+# hence --server-args; the node image must have been built from a tree that
+# includes the RC_* settings in config/supervisord.conf.
+
+def record_key(n):
+    return 'k%d' % n
+
+def connect(ensemble):
+    rc = ramcloud.RAMCloud()
+    rc.connect('zk:' + ctu.external_storage_string(ensemble), 'main')
+    return rc
+
+def table_name(t):
+    return 'recovery%d' % t
+
+def load(ensemble, table, first, last, value, batch):
+    # Writes records first..last-1 of one table
+    rc = connect(ensemble)
+    for start in range(first, last, batch):
+        end = min(start + batch, last)
+        rc.multi_write(table, [(record_key(n), value, None) for n in range(start, end)])
+
+def preload(ensemble, tables, records_per_table, value, args):
+    # Spreads the load of every table over --loaders processes
+    chunk = max(1, records_per_table // args.loaders)
+    jobs = [(ensemble, table, first, min(first + chunk, records_per_table), value, args.batch)
+            for table in tables
+            for first in range(0, records_per_table, chunk)]
+    with multiprocessing.Pool(args.loaders) as pool:
+        pool.starmap(load, jobs)
+
+def read_random(ensemble, tables, records_per_table, stop_at, seed, results):
+    # Reads random keys until stop_at (shared, and set once the measurement is over), counting them
+    rc = connect(ensemble)
+    rng = random.Random(seed)
+    reads = 0
+    while time.time() < stop_at.value:
+        rc.read(rng.choice(tables), record_key(rng.randrange(records_per_table)))
+        reads += 1
+    results.put(reads)
+
+def measure_reads(ensemble, tables, records_per_table, args, until):
+    # Runs --readers read_random processes until until() returns, and returns their reads per second
+    stop_at = multiprocessing.Value('d', float('inf'))
+    results = multiprocessing.Queue()
+    readers = [multiprocessing.Process(target=read_random,
+                                       args=(ensemble, tables, records_per_table, stop_at, s, results))
+               for s in range(args.readers)]
+    for p in readers:
+        p.start()
+    start = time.time()
+    try:
+        until()
+    finally:
+        stop_at.value = time.time()
+    reads = sum(results.get() for _ in readers)
+    for p in readers:
+        p.join()
+    return reads / max(stop_at.value - start, 1e-9)
+
+def check_all_readable(rc, tables, records_per_table, value, batch):
+    for table in tables:
+        for start in range(0, records_per_table, batch):
+            keys = [record_key(n) for n in range(start, min(start + batch, records_per_table))]
+            for result in rc.multi_read(table, keys):
+                if isinstance(result, Exception):
+                    raise result
+                assert result[0] == value, 'wrong value after recovery'
+
+def choose_victim(x, table, kill):
+    # Returns the host whose rc-server to kill: the master of the first key of table, or one of its backups
+    master = ctu.get_host(x.rc_client.testing_get_service_locator(table, record_key(0)))
+    if kill == 'master':
+        return master
+    if x.server_options.use_plus_one_backup:
+        return x.topology.server(x.getPlusOneBackupId(x.topology.up_server_on(master).server_id)).host
+    # without plus-one backups any other server may hold a replica; take the next one along
+    hosts = sorted(s.host for s in x.topology.servers() if s.is_up)
+    return hosts[(hosts.index(master) + 1) % len(hosts)]
+
+def run(args, data_mb, num_nodes, replicas, plus_one, window):
+    records = data_mb * 1000 * 1000 // args.value_size
+    records_per_table = max(1, records // args.tables)
+    value = 'x' * args.value_size
+    options = ctu.ServerOptions(replicas = replicas, use_plus_one_backup = plus_one,
+                                plus_one_backup_window = window, args = args.server_args)
+
+    x = ctu.ClusterTest()
+    x.setUp(num_nodes = num_nodes, server_options = options)
+    try:
+        tables = []
+        for t in range(args.tables):
+            x.rc_client.create_table(table_name(t), args.server_span)
+            tables.append(x.rc_client.get_table_id(table_name(t)))
+        load_start = time.time()
+        preload(x.ensemble, tables, records_per_table, value, args)
+        load_s = time.time() - load_start
+
+        baseline_ops = measure_reads(x.ensemble, tables, records_per_table, args,
+                                     lambda: time.sleep(args.baseline_seconds))
+
+        victim = choose_victim(x, tables[0], args.kill)
+        timings = {}
+        def kill_and_recover():
+            killed_at = time.time()
+            x.killProcess(victim, 'rc-server', 'SIGKILL')
+            probe = connect(x.ensemble)
+            probe.read(tables[0], record_key(0))
+            timings['first_read_s'] = time.time() - killed_at
+            check_all_readable(probe, tables, records_per_table, value, args.batch)
+            timings['all_readable_s'] = time.time() - killed_at
+        recovery_ops = measure_reads(x.ensemble, tables, records_per_table, args, kill_and_recover)
+    finally:
+        x.tearDown()
+
+    return {
+        'data_mb': data_mb,
+        'tables': args.tables,
+        'records': records_per_table * args.tables,
+        'value_size': args.value_size,
+        'nodes': num_nodes,
+        'replicas': replicas,
+        'use_plus_one_backup': plus_one,
+        'plus_one_backup_window': window,
+        'server_args': args.server_args,
+        'kill': args.kill,
+        'load_s': round(load_s, 2),
+        'first_read_s': round(timings['first_read_s'], 3),
+        'all_readable_s': round(timings['all_readable_s'], 3),
+        'baseline_ops': round(baseline_ops, 1),
+        'recovery_ops': round(recovery_ops, 1),
+    }
+
+def parse_bool(text):
+    if text.lower() in ('true', 'yes', '1'):
+        return True
+    if text.lower() in ('false', 'no', '0'):
+        return False
+    raise argparse.ArgumentTypeError('expected true or false, got %r' % text)
+
+if __name__ == '__main__':
+    # We list all argument default values as part of the "help menu"
+    parser = argparse.ArgumentParser(formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+    parser.add_argument('--data-mb', type=int, nargs='+', default=[100],
+                        help="Megabytes of values to preload; one run per size")
+    parser.add_argument('--nodes', '-n', type=int, nargs='+', default=[4],
+                        help="Numbers of nodes in the cluster; one run per count")
+    parser.add_argument('--replicas', '-r', type=int, nargs='+', default=[1],
+                        help="rc-server --replicas values; one run per value")
+    parser.add_argument('--plus-one-backup', type=parse_bool, nargs='+', default=[True],
+                        help="rc-server --usePlusOneBackup values (true/false); one run per value")
+    parser.add_argument('--backup-window', '-w', type=int, nargs='+', default=[1],
+                        help="rc-server --plusOneBackupWindow values, used with plus-one backups; "
+                             "one run per value")
+    parser.add_argument('--server-args', type=str, default='',
+                        help="Extra rc-server arguments, e.g. --totalMasterMemory 4000")
+    parser.add_argument('--tables', '-t', type=int, default=4,
+                        help="Number of tables to spread the data over")
+    parser.add_argument('--server-span', type=int, default=1,
+                        help="Number of servers to split each table across")
+    parser.add_argument('--value-size', '-s', type=int, default=1000,
+                        help="Size of each value in bytes")
+    parser.add_argument('--kill', '-k', type=str, default='master', choices=['master', 'backup'],
+                        help="Kill the master of the first table, or a backup of it")
+    parser.add_argument('--loaders', type=int, default=4,
+                        help="Number of processes preloading the data")
+    parser.add_argument('--batch', type=int, default=1000,
+                        help="Records per multi_write while preloading, and per multi_read while checking")
+    parser.add_argument('--readers', type=int, default=2,
+                        help="Number of processes reading random keys to measure throughput")
+    parser.add_argument('--baseline-seconds', type=float, default=5.0,
+                        help="Seconds to measure read throughput for before the kill")
+    parser.add_argument('--output', '-o', type=str, default=None,
+                        help="File to append a JSON line per run to")
+    args = parser.parse_args()
+
+    for data_mb, num_nodes, replicas, plus_one, window in itertools.product(args.data_mb, args.nodes,
+                                                                             args.replicas, args.plus_one_backup,
+                                                                             args.backup_window):
+        if replicas >= num_nodes:
+            print("skipping %d replicas on %d nodes" % (replicas, num_nodes), file=sys.stderr)
+            continue
+        if window > 1 and not plus_one:
+            # the window only applies to plus-one backups; this run would repeat the window 1 one
+            continue
+        result = run(args, data_mb, num_nodes, replicas, plus_one, window)
+        line = json.dumps(result, sort_keys=True)
+        print(line)
+        if args.output:
+            with open(args.output, 'a') as f:
+                f.write(line + '\n')
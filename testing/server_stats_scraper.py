@@ -0,0 +1,156 @@
+import argparse
+import json
+import re
+import sys
+import time
+
+import cluster_test_utils as ctu
+import ramcloud
+
+from google.protobuf import descriptor
+
+# Polls every server registered under /ramcloud/main/servers for its
+# ServerStatistics, LogMetrics and raw metrics (which include a count and
+# total time per RPC type), flattens the protos into dotted metric names and
+# keeps a time series per server. The series can be written out as JSON
+# lines, one per server per poll, to line up client latency spikes with
+# cleaner activity, log memory pressure or spin lock contention on a
+# particular master.
+#
+# Usage in Python interpreter, alongside a ClusterTest:
+# >>> import server_stats_scraper as sss
+# >>> scraper = sss.StatsScraper(x.ensemble, x.rc_client)
+# >>> scraper.scrape()
+# < Do some stuff >
+# >>> scraper.scrape()
+# >>> scraper.deltas('log.cleaner')
+#
+# Or from the command line, against a running cluster:
+#   python3 testing/server_stats_scraper.py -i 1 -o /src/tmp/stats.jsonl
+
+# What gets written out unless --filter says otherwise: log memory use,
+# cleaner activity, spin lock contention and RPC counts and times.
+default_filter = r'memory|utiliz|segment|clean|lock|contend|rpc'
+
+def flatten(message, prefix, out):
+    # Add every numeric field of a proto to out, keyed by its dotted path.
+    # Entries of repeated messages are keyed by their name field when they
+    # have one (spin locks, say), and by position otherwise. Repeated numbers,
+    # like histogram buckets, are kept as lists.
+    for field, value in message.ListFields():
+        path = prefix + '.' + field.name
+        if field.type == descriptor.FieldDescriptor.TYPE_MESSAGE:
+            if field.label == descriptor.FieldDescriptor.LABEL_REPEATED:
+                for i, item in enumerate(value):
+                    label = getattr(item, 'name', None) or str(i)
+                    flatten(item, '%s.%s' % (path, label), out)
+            else:
+                flatten(value, path, out)
+        elif field.label == descriptor.FieldDescriptor.LABEL_REPEATED:
+            if value and isinstance(value[0], (int, float)):
+                out[path] = list(value)
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            out[path] = value
+    return out
+
+def get_servers(ensemble):
+    # Returns (server_id, service_locator) of each server in ZooKeeper.
+    zk_client = ctu.get_zookeeper_client(ensemble)
+    try:
+        servers = ctu.ZkSnapshot(zk_client, [ctu.servers_config]).servers()
+    finally:
+        zk_client.stop()
+    return [(s.server_id, s.service_locator) for s in servers]
+
+class StatsScraper:
+    def __init__(self, ensemble, rc_client=None, filter=default_filter):
+        self.ensemble = ensemble
+        if rc_client is None:
+            rc_client = ramcloud.RAMCloud()
+            rc_client.connect('zk:' + ctu.external_storage_string(ensemble), 'main')
+        self.rc_client = rc_client
+        self.filter = re.compile(filter, re.IGNORECASE) if filter else None
+        # server_id -> list of (time, {metric: value})
+        self.series = {}
+
+    def scrape_server(self, locator):
+        # Not every server runs every service (only masters have a log), so
+        # a fetch that fails is left out rather than failing the poll.
+        metrics = {}
+        fetches = [('stats', self.rc_client.get_server_statistics),
+                   ('log', self.rc_client.get_log_metrics)]
+        for prefix, fetch in fetches:
+            try:
+                flatten(fetch(locator), prefix, metrics)
+            except Exception as e:
+                ctu.logger.debug('fetching %s from %s failed: %s', prefix, locator, e)
+        try:
+            for name, value in self.rc_client.get_server_metrics(locator).items():
+                metrics['metrics.' + name] = value
+        except Exception as e:
+            ctu.logger.debug('fetching metrics from %s failed: %s', locator, e)
+        if self.filter:
+            metrics = {k: v for (k, v) in metrics.items() if self.filter.search(k)}
+        return metrics
+
+    def scrape(self):
+        # Polls every server once; returns the samples taken as a list of
+        # (time, server_id, locator, metrics).
+        samples = []
+        for (server_id, locator) in get_servers(self.ensemble):
+            now = time.time()
+            metrics = self.scrape_server(locator)
+            self.series.setdefault(server_id, []).append((now, metrics))
+            samples.append((now, server_id, locator, metrics))
+        return samples
+
+    def deltas(self, prefix=''):
+        # For each server, the change per second of every numeric metric
+        # starting with prefix between its last two samples. Counters such as
+        # cleaner passes or contended lock acquisitions are most telling as
+        # rates.
+        result = {}
+        for (server_id, samples) in self.series.items():
+            if len(samples) < 2:
+                continue
+            (t0, old), (t1, new) = samples[-2:]
+            result[server_id] = {
+                k: (v - old[k]) / (t1 - t0)
+                for (k, v) in new.items()
+                if k.startswith(prefix) and not isinstance(v, list) and k in old}
+        return result
+
+if __name__ == '__main__':
+    # We list all argument default values as part of the "help menu"
+    parser = argparse.ArgumentParser(formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+    parser.add_argument('--nodes', '-n', type=int, default=3,
+                        help="Number of zookeeper nodes in the cluster")
+    parser.add_argument('--interval', '-i', type=float, default=5.0,
+                        help="Seconds between polls")
+    parser.add_argument('--count', '-c', type=int, default=0,
+                        help="Number of polls to take; 0 polls until interrupted")
+    parser.add_argument('--filter', '-f', type=str, default=default_filter,
+                        help="Regular expression selecting the metrics to keep; empty keeps all")
+    parser.add_argument('--output', '-o', type=str, default=None,
+                        help="File to append JSON lines to; stdout if omitted")
+    args = parser.parse_args()
+
+    scraper = StatsScraper(ctu.get_ensemble(args.nodes), filter=args.filter)
+    out = open(args.output, 'a') if args.output else sys.stdout
+    polls = 0
+    try:
+        while True:
+            for (now, server_id, locator, metrics) in scraper.scrape():
+                out.write(json.dumps({'time': now, 'server_id': server_id,
+                                      'locator': locator, 'metrics': metrics},
+                                     sort_keys=True) + '\n')
+            out.flush()
+            polls += 1
+            if args.count and polls >= args.count:
+                break
+            time.sleep(args.interval)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        if out is not sys.stdout:
+            out.close()
@@ -10,100 +10,130 @@ import cluster_test_utils as ctu
 
 x = ctu.ClusterTest()
 
+def tearDownModule():
+    x.tearDown()
+
+# Segment writes (replica opens, appends and closes) taken so far by each backup that's up, by server id, from
+# the backup.writeCount server metric.
+def backup_writes():
+    return {s.server_id: x.rc_client.get_server_metrics(s.service_locator).get('backup.writeCount', 0)
+            for s in x.topology.servers() if s.is_up and s.has_service(ctu.backup_service)}
+
+# How long the new backup must go without taking a write for re-replication to count as done
+settle_seconds = 1
+
+def wait_for_rereplication(master_id, backup_id, writes_before):
+    # The coordinator takes a crashed server out of the server list once it has recovered the server's
+    # tablets, and the master's plus-one selector then moves on to the next backup in the list. The master
+    # re-replicates the segments backup_id held there, so wait until that backup has taken writes since
+    # writes_before (from backup_writes() while backup_id was still up) and then none for settle_seconds.
+    def removed(topology):
+        server = topology.server(backup_id)
+        return server is None or server.status not in (ctu.server_status_up, ctu.server_status_crashed)
+    x.topology.wait_for('server {} to be removed'.format(backup_id), removed)
+    new_backup_id = x.getPlusOneBackupId(master_id)
+    locator = x.topology.server(new_backup_id).service_locator
+    last = [writes_before.get(new_backup_id, 0), None]
+    def settled():
+        writes = x.rc_client.get_server_metrics(locator).get('backup.writeCount', 0)
+        if writes != last[0]:
+            last[:] = [writes, time.time()]
+        return last[1] is not None and time.time() - last[1] >= settle_seconds
+    ctu.wait_until('server {} to re-replicate to server {}'.format(master_id, new_backup_id), settled,
+                   interval=settle_seconds / 4)
+
 class TestBackupServer(unittest.TestCase):
     def setUp(self):
-        x.setUp(num_nodes = 4)
+        x.setUp(num_nodes = 4, reuse = True)
         x.createTestValue()
-        # NOTE: This has to be done after the first table is made. Otherwise, data isn't always present.
-        x.buildServerIdMap()
 
     def tearDown(self):
-        x.tearDown()
+        x.tearDown(keep = True)
 
     @timeout(ten_minutes)
     def test_down_can_still_read(self):
         value = x.rc_client.read(x.table, 'testKey')
-        expect(value).equals(('testValue', 1))
+        expect(value).equals(('testValue', x.test_version))
         server_id = x.rc_client.testing_get_server_id(x.table, 'testKey')
 
         # find the host corresponding to the backup data, and kill that
         backup_id = x.getPlusOneBackupId(server_id)
-        host = x.server_id_to_host[backup_id]
-        x.node_containers[host].exec_run('killall -SIGKILL rc-server')
+        host = x.topology.server(backup_id).host
+        x.killProcess(host, 'rc-server')
 
         # read the value again (without waiting for backup to recover).
         # We expect the same value.
         value = x.rc_client.read(x.table, 'testKey')
-        expect(value).equals(('testValue', 1))
+        expect(value).equals(('testValue', x.test_version))
 
     @timeout(ten_minutes)
     def test_down_can_still_write(self):
         value = x.rc_client.read(x.table, 'testKey')
-        expect(value).equals(('testValue', 1))
+        expect(value).equals(('testValue', x.test_version))
         server_id = x.rc_client.testing_get_server_id(x.table, 'testKey')
 
         # find the host corresponding to the backup data, and kill that
         backup_id = x.getPlusOneBackupId(server_id)
-        host = x.server_id_to_host[backup_id]
-        x.node_containers[host].exec_run('killall -SIGKILL rc-server')
+        host = x.topology.server(backup_id).host
+        x.killProcess(host, 'rc-server')
 
         # after the backup goes down, we try to write (not read). We expect
         # the read that follows to correctly contain our value.
         x.rc_client.write(x.table, 'testKey', 'testValue2')
         value = x.rc_client.read(x.table, 'testKey')
-        expect(value).equals(('testValue2', 2))
+        expect(value).equals(('testValue2', x.test_version + 1))
 
     @timeout(ten_minutes)
     def test_two_downs_can_still_read(self):
         value = x.rc_client.read(x.table, 'testKey')
-        expect(value).equals(('testValue', 1))
+        expect(value).equals(('testValue', x.test_version))
         server_id = x.rc_client.testing_get_server_id(x.table, 'testKey')
 
         # find the host corresponding to the backup data, and kill that
         backup_id = x.getPlusOneBackupId(server_id)
-        host = x.server_id_to_host[backup_id]
-        x.node_containers[host].exec_run('killall -SIGKILL rc-server')
+        writes_before = backup_writes()
+        host = x.topology.server(backup_id).host
+        x.killProcess(host, 'rc-server')
 
         # read the value again (without waiting for backup to recover).
         # We expect the same value.
         value = x.rc_client.read(x.table, 'testKey')
-        expect(value).equals(('testValue', 1))
+        expect(value).equals(('testValue', x.test_version))
 
-        # down the master server after 3 seconds. This should be enough
-        # time for a new backup of the data to be made before it's lost
-        # forever.
-        time.sleep(3)
-        host = x.server_id_to_host[server_id]
-        x.node_containers[host].exec_run('killall -SIGKILL rc-server')
+        # down the master server once the backup is gone for good, so that
+        # a new backup of the data has been made before it's lost forever.
+        wait_for_rereplication(server_id, backup_id, writes_before)
+        host = x.topology.server(server_id).host
+        x.killProcess(host, 'rc-server')
 
         # read the value again. We expect the same value.
         value = x.rc_client.read(x.table, 'testKey')
-        expect(value).equals(('testValue', 1))
+        expect(value).equals(('testValue', x.test_version))
 
     @timeout(ten_minutes)
     def test_two_downs_can_still_write(self):
         value = x.rc_client.read(x.table, 'testKey')
-        expect(value).equals(('testValue', 1))
+        expect(value).equals(('testValue', x.test_version))
         server_id = x.rc_client.testing_get_server_id(x.table, 'testKey')
 
         # find the host corresponding to the backup data, and kill that
         backup_id = x.getPlusOneBackupId(server_id)
-        host = x.server_id_to_host[backup_id]
-        x.node_containers[host].exec_run('killall -SIGKILL rc-server')
+        writes_before = backup_writes()
+        host = x.topology.server(backup_id).host
+        x.killProcess(host, 'rc-server')
 
         # write a new value without waiting for backup to recover.
         x.rc_client.write(x.table, 'testKey', 'testValue2')
 
-        # down the master server after 3 seconds. This should be enough
-        # time for a new backup of the data to be made before it's lost
-        # forever.
-        time.sleep(3)
-        host = x.server_id_to_host[server_id]
-        x.node_containers[host].exec_run('killall -SIGKILL rc-server')
+        # down the master server once the backup is gone for good, so that
+        # a new backup of the data has been made before it's lost forever.
+        wait_for_rereplication(server_id, backup_id, writes_before)
+        host = x.topology.server(server_id).host
+        x.killProcess(host, 'rc-server')
 
         # read the value again. We expect the new value.
         value = x.rc_client.read(x.table, 'testKey')
-        expect(value).equals(('testValue2', 2))
+        expect(value).equals(('testValue2', x.test_version + 1))
 
 if __name__ == '__main__':
     unittest.main()
@@ -10,33 +10,39 @@ import cluster_test_utils as ctu
 
 x = ctu.ClusterTest()
 
+def tearDownModule():
+    x.tearDown()
+
 class TestElectedCoordinator(unittest.TestCase):
     def setUp(self):
-        x.setUp(num_nodes = 4)
+        x.setUp(num_nodes = 4, reuse = True)
         x.createTestValue()
 
     def tearDown(self):
-        x.tearDown()
+        x.tearDown(keep = True)
 
     @timeout(ten_minutes)
     def test_down_can_still_read(self):
         value = x.rc_client.read(x.table, 'testKey')
-        expect(value).equals(('testValue', 1))
+        expect(value).equals(('testValue', x.test_version))
 
         # find the host corresponding to the elected coordinator, kill its rc-coordinator!
         # we should still be able to get the testKey.
         zk_client = ctu.get_zookeeper_client(x.ensemble)
         locator =  zk_client.get('/ramcloud/main/coordinator')[0].decode()
         host = ctu.get_host(locator)
-        x.node_containers[host].exec_run('killall -SIGKILL rc-coordinator')
+        x.killProcess(host, 'rc-coordinator')
 
         # after the coordinator is down, we try to read. We expect
         # to see our value.
         value = x.rc_client.read(x.table, 'testKey')
-        time.sleep(3)  # 3 seconds is needed for a new coordinator to be elected & results to show in zk
+        # wait for a new coordinator to be elected & results to show in zk
+        ctu.wait_until('a new coordinator',
+                       lambda: zk_client.get('/ramcloud/main/coordinator')[0].decode() != locator,
+                       timeout = 60)
         new_locator =  zk_client.get('/ramcloud/main/coordinator')[0].decode()
 
-        expect(value).equals(('testValue', 1))
+        expect(value).equals(('testValue', x.test_version))
         expect(new_locator).not_equals(None)
         expect(new_locator).not_equals(locator)
 
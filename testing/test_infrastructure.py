@@ -7,6 +7,7 @@ from pyexpect import expect
 from timeout_decorator import timeout
 from cluster_test_utils import ten_minutes
 import cluster_test_utils as ctu
+import server_stats_scraper
 
 x = ctu.ClusterTest()
 
@@ -31,6 +32,33 @@ class TestInfrastructure(unittest.TestCase):
         expect(table_parsed.id).equals(1)
         expect(table_parsed.name).equals("test")
 
+    @timeout(ten_minutes)
+    def test_zookeeper_snapshot(self):
+        x.createTestValue()
+        snapshot = x.zkSnapshot()
+
+        expect([t.name for t in snapshot.tables()]).equals(['test'])
+        expect(len(snapshot.servers())).equals(len(x.ensemble))
+        expect(ctu.get_table_names(x.ensemble)).equals(['test'])
+
+    @timeout(ten_minutes)
+    def test_cluster_topology(self):
+        servers = x.topology.servers()
+        expect([s.server_id for s in servers]).equals([1, 2, 3])
+        expect(x.topology.coordinator()).is_instance(str)
+        # plus-one backups wrap around the server list
+        expect(x.topology.backup_candidates(1, window = 2)).equals([2, 3])
+        expect(x.getPlusOneBackupId(3)).equals(1)
+
+        events = []
+        x.topology.subscribe(events.append)
+        x.killProcess(servers[1].host, 'rc-server')
+        x.topology.wait_for('server 2 to crash', lambda t: not t.server(2) or not t.server(2).is_up)
+        expect(events[0].kind != 'added').equals(True)
+        expect(events[0].previous.server_id).equals(2)
+        # with server 2 down, server 1 is backed up by the next one along
+        expect(x.getPlusOneBackupId(1)).equals(3)
+
     @timeout(ten_minutes)
     def test_read_write(self):
         x.rc_client.create_table('test_table')
@@ -51,5 +79,20 @@ class TestInfrastructure(unittest.TestCase):
 
         expect(value).equals('Good weather')
 
+    @timeout(ten_minutes)
+    def test_server_stats_scraper(self):
+        x.createTestValue()
+        scraper = server_stats_scraper.StatsScraper(x.ensemble, x.rc_client, filter=None)
+        samples = scraper.scrape()
+        x.rc_client.read(x.table, 'testKey')
+        scraper.scrape()
+
+        # every server answers, and at least one master reports its log
+        expect(len(samples)).equals(len(x.ensemble))
+        metrics = [m for (_, _, _, m) in samples]
+        expect(any(k.startswith('log.') for m in metrics for k in m)).equals(True)
+        expect(any(k.startswith('metrics.') for m in metrics for k in m)).equals(True)
+        expect(len(scraper.deltas())).equals(len(x.ensemble))
+
 if __name__ == '__main__':
     unittest.main()
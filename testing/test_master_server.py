@@ -10,53 +10,56 @@ import cluster_test_utils as ctu
 
 x = ctu.ClusterTest()
 
+def tearDownModule():
+    x.tearDown()
+
 class TestMasterServer(unittest.TestCase):
     def setUp(self):
-        x.setUp(num_nodes = 4)
+        x.setUp(num_nodes = 4, reuse = True)
         x.createTestValue()
 
     def tearDown(self):
-        x.tearDown()
+        x.tearDown(keep = True)
 
-    def simple_recovery(self, kill_command):
+    def simple_recovery(self, signal):
         value = x.rc_client.read(x.table, 'testKey')
-        expect(value).equals(('testValue', 1))
+        expect(value).equals(('testValue', x.test_version))
 
         # find the host corresponding to the server with our table and 'testKey',
         # then kill its rc-server!
         locator =  x.rc_client.testing_get_service_locator(x.table, 'testKey')
         host = ctu.get_host(locator)
-        x.node_containers[host].exec_run(kill_command)
+        x.killProcess(host, 'rc-server', signal)
 
         # read the value again (without waiting for the server to recover). It 
         # should come out to the same value
         value = x.rc_client.read(x.table, 'testKey')
-        expect(value).equals(('testValue', 1))
+        expect(value).equals(('testValue', x.test_version))
 
     @timeout(ten_minutes)
     def test_graceful_down_can_still_read(self):
-        self.simple_recovery(kill_command = 'killall -SIGTERM rc-server')
+        self.simple_recovery(signal = 'SIGTERM')
 
     @timeout(ten_minutes)
     def test_forced_down_can_still_read(self):
-        self.simple_recovery(kill_command = 'killall -SIGKILL rc-server')
+        self.simple_recovery(signal = 'SIGKILL')
 
     @timeout(ten_minutes)
     def test_down_can_still_write(self):
         value = x.rc_client.read(x.table, 'testKey')
-        expect(value).equals(('testValue', 1))
+        expect(value).equals(('testValue', x.test_version))
 
         # find the host corresponding to the server with our table and 'testKey',
         # then kill its rc-server!
         locator =  x.rc_client.testing_get_service_locator(x.table, 'testKey')
         host = ctu.get_host(locator)
-        x.node_containers[host].exec_run('killall -SIGKILL rc-server')
+        x.killProcess(host, 'rc-server')
 
         # after the master server is down, we try to write (not read). We expect
         # the read that follows to correctly contain our value.
         x.rc_client.write(x.table, 'testKey', 'testValue2')
         value = x.rc_client.read(x.table, 'testKey')
-        expect(value).equals(('testValue2', 2))
+        expect(value).equals(('testValue2', x.test_version + 1))
 
 if __name__ == '__main__':
     unittest.main()
@@ -1,5 +1,8 @@
 import os
+import asyncio
 import ramcloud
+import aioramcloud
+import tablescan
 import time
 import datetime
 import Table_pb2
@@ -35,5 +38,168 @@ class TestReadWrite(unittest.TestCase):
             ts2 = time.time()
             print("That one took:", datetime.datetime.fromtimestamp(ts2-ts1).strftime('%H:%M:%S:%f'))
 
+    @timeout(ten_minutes)
+    def test_multi_read(self):
+        keys = ['multiKey_%d' % i for i in range(0, 100)]
+        for key in keys:
+            x.rc_client.write(x.table, key, 'multiValue_' + key)
+        values = x.rc_client.multi_read(x.table, keys + ['missingKey'])
+        expect(len(values)).equals(101)
+        for i, key in enumerate(keys):
+            expect(values[i]).equals(('multiValue_' + key, i + 2))
+        expect(values[100]).is_instance(ramcloud.NoObjectError)
+
+    @timeout(ten_minutes)
+    def test_multi_write_remove(self):
+        objects = [('batchKey_%d' % i, 'batchValue_%d' % i, None)
+                   for i in range(0, 100)]
+        versions = x.rc_client.multi_write(x.table, objects)
+        expect(versions).equals(list(range(2, 102)))
+        # conditional writes behave like write_rr, object by object
+        stale = ramcloud.RejectRules.exactly(1)
+        results = x.rc_client.multi_write(
+            x.table, [('batchKey_0', 'new', ramcloud.RejectRules.exactly(2)),
+                      ('batchKey_1', 'new', stale)])
+        expect(results[0]).equals(102)
+        expect(results[1]).is_instance(ramcloud.VersionError)
+        expect(x.rc_client.read(x.table, 'batchKey_1')).equals(
+            ('batchValue_1', 3))
+        versions = x.rc_client.multi_remove(x.table, objects)
+        expect(versions[0]).equals(102)
+        expect(versions[1:]).equals(list(range(3, 102)))
+        with self.assertRaises(ramcloud.NoObjectError):
+            x.rc_client.read(x.table, 'batchKey_0')
+
+    @timeout(ten_minutes)
+    def test_multi_write_buffers(self):
+        # multi_write takes the same value types as write
+        value = bytes(range(256))
+        versions = x.rc_client.multi_write(
+            x.table, [('bufKey_0', bytearray(value), None),
+                      ('bufKey_1', memoryview(value), None),
+                      ('bufKey_2', value, None)])
+        for i in range(0, 3):
+            expect(x.rc_client.read_bytes(x.table, 'bufKey_%d' % i)).equals(
+                (value, versions[i]))
+
+    @timeout(ten_minutes)
+    def test_multi_increment(self):
+        objects = [('counter_%d' % i, i, None) for i in range(0, 10)]
+        x.rc_client.multi_increment(x.table, objects)
+        results = x.rc_client.multi_increment(x.table, objects)
+        expect([value for value, _ in results]).equals(
+            [2 * i for i in range(0, 10)])
+
+    @timeout(ten_minutes)
+    def test_async_reads_and_writes(self):
+        arc = aioramcloud.AsyncRAMCloud(x.rc_client, window=64)
+        keys = ['asyncKey_%d' % i for i in range(0, 1000)]
+        async def work():
+            await asyncio.gather(*[arc.write(x.table, key, 'v_' + key)
+                                   for key in keys])
+            return await asyncio.gather(*[arc.read(x.table, key)
+                                          for key in keys])
+        values = asyncio.run(work())
+        expect([value for value, _ in values]).equals(
+            ['v_' + key for key in keys])
+
+    @timeout(ten_minutes)
+    def test_transactions(self):
+        x.rc_client.write(x.table, 'txA', '10')
+        x.rc_client.write(x.table, 'txB', '0')
+        tx = x.rc_client.transaction()
+        tx.write(x.table, 'txA', str(int(tx.read(x.table, 'txA')) - 5))
+        tx.write(x.table, 'txB', str(int(tx.read(x.table, 'txB')) + 5))
+        tx.commit_async()
+        while not tx.commit_ready():
+            tx.poll()
+        expect(tx.result()).equals(True)
+        expect(x.rc_client.read(x.table, 'txA')[0]).equals('5')
+        expect(x.rc_client.read(x.table, 'txB')[0]).equals('5')
+
+        # a reject rule aborts the whole transaction
+        tx = x.rc_client.transaction()
+        tx.write(x.table, 'txA', 'bad', ramcloud.RejectRules.exactly(1))
+        tx.write(x.table, 'txB', 'bad')
+        expect(tx.commit()).equals(False)
+        expect(x.rc_client.read(x.table, 'txB')[0]).equals('5')
+
+    @timeout(ten_minutes)
+    def test_binary_reads(self):
+        value = bytes(range(256)) * 64
+        version = x.rc_client.write(x.table, 'binaryKey', bytearray(value))
+        expect(x.rc_client.read_bytes(x.table, 'binaryKey')).equals(
+            (value, version))
+        view, _ = x.rc_client.read_view(x.table, 'binaryKey')
+        expect(view.tobytes()).equals(value)
+        target = bytearray(len(value))
+        expect(x.rc_client.read_into(x.table, 'binaryKey', target)).equals(
+            (len(value), version))
+        expect(bytes(target)).equals(value)
+        # a buffer that is too small is filled as far as it goes
+        target = bytearray(10)
+        expect(x.rc_client.read_into(x.table, 'binaryKey', target)).equals(
+            (len(value), version))
+        expect(bytes(target)).equals(value[:10])
+
+    @timeout(ten_minutes)
+    def test_enumerate(self):
+        x.rc_client.create_table('enumerated', 3)
+        table = x.rc_client.get_table_id('enumerated')
+        expected = {}
+        for i in range(0, 1000):
+            version = x.rc_client.write(table, 'enumKey_%d' % i, 'v%d' % i)
+            expected['enumKey_%d' % i] = ('v%d' % i, version)
+        found = dict((key, (value, version)) for key, value, version
+                     in x.rc_client.enumerate(table, batch_hint=64))
+        expect(found).equals(expected)
+        keys = [key for key, value, _ in
+                x.rc_client.enumerate(table, keys_only=True)]
+        expect(sorted(keys)).equals(sorted(expected.keys()))
+
+        def connect():
+            rc = ramcloud.RAMCloud()
+            rc.connect('zk:' + ctu.external_storage_string(x.ensemble),
+                       'main')
+            return rc
+        expect(len(x.rc_client.get_tablets(table))).equals(3)
+        found = dict((key, (value, version)) for key, value, version
+                     in tablescan.enumerate_parallel(x.rc_client, table,
+                                                     connect))
+        expect(found).equals(expected)
+
+    @timeout(ten_minutes)
+    def test_index_lookup(self):
+        x.rc_client.create_table('indexed', 2)
+        table = x.rc_client.get_table_id('indexed')
+        x.rc_client.create_index(table, 1, num_indexlets=2)
+        expected = []
+        for i in range(0, 300):
+            version = x.rc_client.write_with_keys(
+                table, 'user_%d' % i, 'v%d' % i, ['name_%04d' % (i % 100)])
+            expected.append(('name_%04d' % (i % 100), 'user_%d' % i,
+                             'v%d' % i, version))
+        # an object without a secondary key is not in the index
+        x.rc_client.write_with_keys(table, 'nameless', 'v', [None])
+
+        # the range is inclusive, and results come in index key order
+        in_range = sorted(e for e in expected
+                          if 'name_0010' <= e[0] <= 'name_0019')
+        found = list(x.rc_client.index_lookup(table, 1, 'name_0010',
+                                              'name_0019', batch_hint=7))
+        expect(len(found)).equals(30)
+        expect(sorted(found)).equals(
+            sorted((key, value, version) for _, key, value, version
+                   in in_range))
+        expect(sorted(k for k, _, _ in found[:3])).equals(
+            ['user_10', 'user_110', 'user_210'])
+        batches = list(x.rc_client.index_lookup_batches(
+            table, 1, 'name_0000', 'name_9999', batch_hint=64, decode=False))
+        expect(max(len(b) for b in batches)).equals(64)
+        expect(sum(len(b) for b in batches)).equals(300)
+        expect(batches[0][0][0]).is_instance(bytes)
+
+        x.rc_client.drop_index(table, 1)
+
 if __name__ == '__main__':
     unittest.main()
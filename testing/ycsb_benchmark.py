@@ -0,0 +1,354 @@
+import argparse
+import json
+import math
+import multiprocessing
+import queue
+import random
+import sys
+import time
+
+import cluster_test_utils as ctu
+import ramcloud
+
+# YCSB-style benchmark for a RAMCloud test cluster.
+#
+# Loads record_count records into a table, then runs one of the YCSB core
+# workloads against it from several processes, each with its own client:
+#
+#   A: 50% read, 50% update            B: 95% read, 5% update
+#   C: 100% read                       D: 95% read, 5% insert (latest keys)
+#   E: 95% scan, 5% insert             F: 50% read, 50% read-modify-write
+#
+# RAMCloud has no ordered range scans, so a "scan" is a multi_read of
+# scan_length consecutive record numbers. The default key distribution of
+# each workload follows YCSB, and may be overridden with --distribution.
+#
+# Results are written as JSON: overall throughput plus, per operation type,
+# the operation count and p50/p99/p999 latency in microseconds. Passing
+# --baseline compares against an earlier result file and exits with status 1
+# if throughput dropped or p99 latency rose by more than --tolerance.
+#
+# An insert claims the next record number, and the record count that reads
+# choose keys below is only raised once its write is done. Inserts finishing
+# out of order can still leave a gap for a moment; reads that land in one
+# are counted as not_found rather than failing the worker.
+#
+# Examples, from the dev-env container:
+#
+#   python3 testing/ycsb_benchmark.py --start-cluster -w A -o /src/tmp/a.json
+#   python3 testing/ycsb_benchmark.py -w B -p 8 --baseline /src/tmp/b.json
+
+workloads = {
+    'A': {'read': 0.5, 'update': 0.5, 'distribution': 'zipfian'},
+    'B': {'read': 0.95, 'update': 0.05, 'distribution': 'zipfian'},
+    'C': {'read': 1.0, 'distribution': 'zipfian'},
+    'D': {'read': 0.95, 'insert': 0.05, 'distribution': 'latest'},
+    'E': {'scan': 0.95, 'insert': 0.05, 'distribution': 'zipfian'},
+    'F': {'read': 0.5, 'rmw': 0.5, 'distribution': 'zipfian'},
+}
+
+operation_types = ['read', 'update', 'insert', 'scan', 'rmw']
+
+def record_key(n):
+    return 'user%d' % n
+
+def fnv_hash(n):
+    # 64-bit FNV-1a over the bytes of n, as YCSB uses to scatter popular items
+    h = 0xcbf29ce484222325
+    for _ in range(8):
+        h ^= n & 0xff
+        h = (h * 0x100000001b3) & 0xffffffffffffffff
+        n >>= 8
+    return h
+
+class ZipfianGenerator:
+    # Gray et al., "Quickly Generating Billion-Record Synthetic Databases";
+    # the same algorithm as YCSB's ZipfianGenerator. Item 0 is most popular.
+    def __init__(self, items, theta=0.99):
+        self.items = items
+        self.theta = theta
+        self.zetan = sum(1.0 / (i ** theta) for i in range(1, items + 1))
+        zeta2 = 1.0 + 1.0 / (2 ** theta)
+        self.alpha = 1.0 / (1.0 - theta)
+        self.eta = (1 - (2.0 / items) ** (1 - theta)) / (1 - zeta2 / self.zetan)
+
+    def next(self, rng):
+        u = rng.random()
+        uz = u * self.zetan
+        if uz < 1.0:
+            return 0
+        if uz < 1.0 + 0.5 ** self.theta:
+            return 1
+        return min(self.items - 1,
+                   int(self.items * (self.eta * u - self.eta + 1) ** self.alpha))
+
+class KeyChooser:
+    # Picks record numbers below the current record count. The zipfian
+    # distribution is scrambled so that popular records are spread over the
+    # key space; latest favors the most recently inserted records.
+    def __init__(self, distribution, record_count):
+        self.distribution = distribution
+        if distribution != 'uniform':
+            self.zipfian = ZipfianGenerator(record_count)
+
+    def next(self, rng, count):
+        if self.distribution == 'uniform':
+            return rng.randrange(count)
+        if self.distribution == 'zipfian':
+            return fnv_hash(self.zipfian.next(rng)) % count
+        if self.distribution == 'latest':
+            return max(0, count - 1 - self.zipfian.next(rng))
+        raise ValueError(self.distribution)
+
+class LatencyHistogram:
+    # Log-scaled buckets, each 1% wider than the last, over microseconds.
+    ratio = math.log(1.01)
+
+    def __init__(self, counts=None):
+        self.counts = counts or {}
+
+    def record(self, micros):
+        bucket = int(math.log(max(micros, 1.0)) / self.ratio)
+        self.counts[bucket] = self.counts.get(bucket, 0) + 1
+
+    def merge(self, other):
+        for bucket, count in other.counts.items():
+            self.counts[bucket] = self.counts.get(bucket, 0) + count
+
+    def total(self):
+        return sum(self.counts.values())
+
+    def percentile(self, p):
+        target = p / 100.0 * self.total()
+        seen = 0
+        for bucket in sorted(self.counts):
+            seen += self.counts[bucket]
+            if seen >= target:
+                return math.exp((bucket + 1) * self.ratio)
+        return 0.0
+
+    def summary(self):
+        return {'count': self.total(),
+                'p50_us': round(self.percentile(50), 1),
+                'p99_us': round(self.percentile(99), 1),
+                'p999_us': round(self.percentile(99.9), 1)}
+
+def connect(args):
+    rc = ramcloud.RAMCloud()
+    rc.connect('zk:' + ctu.external_storage_string(ctu.get_ensemble(args.nodes)),
+               'main')
+    return rc
+
+def load(args, worker, table, value):
+    # Each worker loads every processes'th record, in multi_write batches.
+    rc = connect(args)
+    numbers = range(worker, args.record_count, args.processes)
+    for start in range(0, len(numbers), args.batch):
+        batch = numbers[start:start + args.batch]
+        rc.multi_write(table, [(record_key(n), value, None) for n in batch])
+
+def run_worker(args, worker, table, value, record_count, next_record, results, stop_at):
+    rc = connect(args)
+    rng = random.Random(args.seed + worker)
+    mix = workloads[args.workload]
+    chooser = KeyChooser(args.distribution or mix['distribution'],
+                         args.record_count)
+    ops = [(op, mix[op]) for op in operation_types if op in mix]
+    histograms = {op: LatencyHistogram() for op, _ in ops}
+    not_found = 0
+
+    def pick_operation():
+        u = rng.random()
+        for op, share in ops:
+            if u < share:
+                return op
+            u -= share
+        return ops[-1][0]
+
+    def run_one(op):
+        nonlocal not_found
+        n = chooser.next(rng, record_count.value)
+        try:
+            if op == 'read':
+                rc.read(table, record_key(n))
+            elif op == 'update':
+                rc.write(table, record_key(n), value)
+            elif op == 'insert':
+                with next_record.get_lock():
+                    n = next_record.value
+                    next_record.value += 1
+                rc.write(table, record_key(n), value)
+                # only now may other workers choose it
+                with record_count.get_lock():
+                    record_count.value = max(record_count.value, n + 1)
+            elif op == 'scan':
+                length = rng.randint(1, args.scan_length)
+                found = rc.multi_read(table, [record_key(min(n + i, record_count.value - 1))
+                                              for i in range(length)])
+                not_found += sum(1 for r in found if isinstance(r, ramcloud.NoObjectError))
+            elif op == 'rmw':
+                _, version = rc.read(table, record_key(n))
+                try:
+                    rc.write_rr(table, record_key(n), value,
+                                ramcloud.RejectRules.exactly(version))
+                except ramcloud.VersionError:
+                    pass
+        except ramcloud.NoObjectError:
+            # a record another worker is still inserting
+            not_found += 1
+
+    warmup_until = time.time() + args.warmup
+    while time.time() < warmup_until:
+        run_one(pick_operation())
+
+    operations = 0
+    start = time.time()
+    while time.time() < stop_at:
+        op = pick_operation()
+        before = time.time()
+        run_one(op)
+        histograms[op].record((time.time() - before) * 1e6)
+        operations += 1
+    results.put((operations, time.time() - start,
+                 {op: h.counts for op, h in histograms.items()}, not_found))
+
+def run(args):
+    rc = connect(args)
+    rc.create_table(args.table, args.server_span)
+    table = rc.get_table_id(args.table)
+    value = 'x' * args.value_size
+
+    print("loading %d records of %d bytes" % (args.record_count, args.value_size))
+    loaders = [multiprocessing.Process(target=load, args=(args, w, table, value))
+               for w in range(args.processes)]
+    for p in loaders:
+        p.start()
+    for p in loaders:
+        p.join()
+
+    print("running workload %s with %d processes for %ds (+%ds warmup)" %
+          (args.workload, args.processes, args.duration, args.warmup))
+    record_count = multiprocessing.Value('q', args.record_count)
+    next_record = multiprocessing.Value('q', args.record_count)
+    results = multiprocessing.Queue()
+    stop_at = time.time() + args.warmup + args.duration
+    workers = [multiprocessing.Process(target=run_worker,
+                                       args=(args, w, table, value, record_count,
+                                             next_record, results, stop_at))
+               for w in range(args.processes)]
+    for p in workers:
+        p.start()
+    collected = collect(workers, results)
+
+    operations = sum(ops for ops, _, _, _ in collected)
+    elapsed = max(seconds for _, seconds, _, _ in collected)
+    histograms = {}
+    for _, _, counts, _ in collected:
+        for op, buckets in counts.items():
+            histograms.setdefault(op, LatencyHistogram()).merge(
+                LatencyHistogram(buckets))
+    return {
+        'workload': args.workload,
+        'distribution': args.distribution or workloads[args.workload]['distribution'],
+        'record_count': args.record_count,
+        'value_size': args.value_size,
+        'processes': args.processes,
+        'duration_s': round(elapsed, 2),
+        'operations': operations,
+        'throughput_ops': round(operations / elapsed, 1),
+        'not_found': sum(missing for _, _, _, missing in collected),
+        'latency': {op: h.summary() for op, h in histograms.items()},
+    }
+
+def collect(workers, results):
+    # Gathers each worker's result, failing instead of waiting forever if a worker dies without one
+    collected = []
+    while len(collected) < len(workers):
+        try:
+            collected.append(results.get(timeout=1))
+        except queue.Empty:
+            failed = [p for p in workers if p.exitcode not in (None, 0)]
+            if failed:
+                for p in workers:
+                    p.terminate()
+                raise RuntimeError("worker %s exited with status %d" % (failed[0].name, failed[0].exitcode))
+    for p in workers:
+        p.join()
+    return collected
+
+def compare(result, baseline, tolerance):
+    # Returns a list of regressions of result relative to baseline.
+    regressions = []
+    if result['throughput_ops'] < baseline['throughput_ops'] * (1 - tolerance):
+        regressions.append("throughput %.1f ops/s < baseline %.1f ops/s" %
+                           (result['throughput_ops'], baseline['throughput_ops']))
+    for op, summary in result['latency'].items():
+        old = baseline['latency'].get(op)
+        if old and summary['p99_us'] > old['p99_us'] * (1 + tolerance):
+            regressions.append("%s p99 %.1fus > baseline %.1fus" %
+                               (op, summary['p99_us'], old['p99_us']))
+    return regressions
+
+if __name__ == '__main__':
+    # We list all argument default values as part of the "help menu"
+    parser = argparse.ArgumentParser(formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+    parser.add_argument('--workload', '-w', type=str, default='A', choices=sorted(workloads),
+                        help="YCSB core workload to run")
+    parser.add_argument('--distribution', type=str, default=None,
+                        choices=['uniform', 'zipfian', 'latest'],
+                        help="Key distribution; defaults to the workload's own")
+    parser.add_argument('--record-count', '-r', type=int, default=100000,
+                        help="Number of records to load")
+    parser.add_argument('--value-size', '-s', type=int, default=1000,
+                        help="Size of each value in bytes")
+    parser.add_argument('--scan-length', type=int, default=100,
+                        help="Maximum records read by one scan (workload E)")
+    parser.add_argument('--processes', '-p', type=int, default=4,
+                        help="Number of load driver processes, each with its own client")
+    parser.add_argument('--duration', '-t', type=int, default=60,
+                        help="Seconds to measure for")
+    parser.add_argument('--warmup', type=int, default=10,
+                        help="Seconds to run before measuring")
+    parser.add_argument('--batch', type=int, default=500,
+                        help="Records per multi_write while loading")
+    parser.add_argument('--table', type=str, default='usertable',
+                        help="Name of the table to load")
+    parser.add_argument('--server-span', type=int, default=1,
+                        help="Number of servers to split the table across")
+    parser.add_argument('--seed', type=int, default=0,
+                        help="Random seed; worker n uses seed + n")
+    parser.add_argument('--nodes', '-n', type=int, default=3,
+                        help="Number of nodes in the cluster")
+    parser.add_argument('--start-cluster', action='store_true',
+                        help="Bring up a fresh cluster first, and tear it down after")
+    parser.add_argument('--output', '-o', type=str, default=None,
+                        help="File to write the JSON results to; stdout if omitted")
+    parser.add_argument('--baseline', '-b', type=str, default=None,
+                        help="JSON results of an earlier run to check for regressions")
+    parser.add_argument('--tolerance', type=float, default=0.1,
+                        help="Fraction by which throughput or p99 may regress")
+    args = parser.parse_args()
+
+    x = None
+    if args.start_cluster:
+        x = ctu.ClusterTest()
+        x.setUp(num_nodes = args.nodes)
+    try:
+        result = run(args)
+    finally:
+        if x:
+            x.tearDown()
+
+    output = json.dumps(result, indent=2, sort_keys=True)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(output + '\n')
+    print(output)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(result, json.load(f), args.tolerance)
+        for regression in regressions:
+            print("REGRESSION:", regression)
+        if regressions:
+            sys.exit(1)